@@ -1,52 +1,131 @@
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
-import cv2
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, Response
+import json
 import os
-import numpy as np
-import random
+import threading
+import uuid
+from functools import wraps
 from io import BytesIO
 from werkzeug.utils import secure_filename
 from datetime import datetime
-from core.face_utils import FaceUtils
-from core.emotion_detector import EmotionDetector
-from core.meme_generator import MemeGenerator
-from core.text_generator import EmotionFusionGenerator
-from core.image_database import create_database
-from core.DatabaseManager import DatabaseManager
-from core.main import generate_meme
+from core.pipeline import MemePipeline
+from core.meme_generator import DEFAULT_FONT_PATH
+from core.emotion_index import EmotionIndex, emotion_vector
+from core.emotion_detector import EMOTION_LABELS
+from core.job_queue import JobQueue, JobQueueFull
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['PROCESSED_FOLDER'] = 'static/processed'
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
+app.config['SAVE_UPLOADS'] = os.getenv('SAVE_UPLOADS', '0') == '1'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_DEPTH'] = int(os.getenv('JOB_QUEUE_DEPTH', 32))
+app.config['FACE_DETECTION_MAX_SIDE'] = int(os.getenv('FACE_DETECTION_MAX_SIDE', 640))
+app.config['EMOTION_DEADLINE'] = float(os.getenv('EMOTION_DEADLINE', 5.0))
+app.config['EMOTION_CASCADE'] = os.getenv('EMOTION_CASCADE', '1') == '1'
+app.config['EMOTION_CASCADE_THRESHOLD'] = float(os.getenv('EMOTION_CASCADE_THRESHOLD', 0.6))
+app.config['PRERENDER_CAPTIONS'] = os.getenv('PRERENDER_CAPTIONS', '1') == '1'
+app.config['PRELOAD_MODELS'] = os.getenv('PRELOAD_MODELS', '1') == '1'
+app.config['DATASET_DB'] = os.getenv('DATASET_DB', 'core/dataset/emotions.sqlite')
+app.config['SIMILAR_MAX_K'] = int(os.getenv('SIMILAR_MAX_K', 100))
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
 
-fonts = ["SourceHanSansSC-Heavy.otf", "Bian.otf", "Jianjian.otf"]
-font_path = "assets/fonts/" + fonts[random.randint(0, 2)]
+font_path = os.getenv('FONT_PATH', DEFAULT_FONT_PATH)
 predictor_path = "core/assets/models/shape_predictor_68_face_landmarks.dat"
 api_key = os.getenv('DEEPSEEK_API_KEY')
 if not api_key:
     print("DEEPSEEK_API_KEY Environment Variable not found.")
-else:
-    efg = EmotionFusionGenerator(api_key)
+
+pipeline = MemePipeline(
+    font_path=font_path,
+    predictor_path=predictor_path,
+    face_detection_max_side=app.config['FACE_DETECTION_MAX_SIDE'],
+    prerender_captions=app.config['PRERENDER_CAPTIONS'],
+    detector_options={
+        'deadline': app.config['EMOTION_DEADLINE'],
+        'cascade': app.config['EMOTION_CASCADE'],
+        'primary_threshold': app.config['EMOTION_CASCADE_THRESHOLD'],
+    },
+    preload=False,
+)
+pipeline_lock = threading.Lock()
+
+
+def load_pipeline():
+    with pipeline_lock:
+        if not pipeline.loaded:
+            pipeline.load()
+        if not pipeline.warmed_up:
+            pipeline.warm_up()
+
+
+def preload_pipeline():
+    try:
+        load_pipeline()
+    except Exception as e:
+        print(f"Error preloading models: {str(e)}")
+
+
+if app.config['PRELOAD_MODELS']:
+    threading.Thread(target=preload_pipeline, name="model-preload", daemon=True).start()
+
+emotion_index = EmotionIndex(app.config['DATASET_DB'])
+
+job_queue = JobQueue(workers=app.config['JOB_WORKERS'], max_depth=app.config['JOB_QUEUE_DEPTH'])
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def ensure_pipeline():
+    """None once the models are ready, otherwise the 503 response to return.
+
+    Answers 503 while the background preload is still running instead of
+    holding the request; with PRELOAD_MODELS=0 the first request loads them."""
+    if not pipeline.warmed_up:
+        if pipeline.load_error:
+            return jsonify({'error': 'Models failed to load', 'status': pipeline.get_status()}), 503
+        if app.config['PRELOAD_MODELS']:
+            response = jsonify({'error': 'Models are still loading', 'status': pipeline.get_status()})
+            return response, 503, {'Retry-After': '5'}
+        try:
+            load_pipeline()
+        except Exception:
+            return jsonify({'error': 'Models failed to load', 'status': pipeline.get_status()}), 503
+    return None
+
+def requires_pipeline(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        unavailable = ensure_pipeline()
+        if unavailable is not None:
+            return unavailable
+        return view(*args, **kwargs)
+    return wrapper
+
 def generate_unique_filename(filename):
+    # batch uploads repeat basenames (e.g. */Anger.jpg) within the same second,
+    # so the timestamp alone does not keep their outputs apart
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     basename, ext = os.path.splitext(secure_filename(filename))
-    return f"{basename}_{timestamp}{ext}"
+    return f"{basename}_{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 
+@app.route('/ready')
+def ready():
+    status = pipeline.get_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
 @app.route('/generate', methods=['POST'])
+@requires_pipeline
 def generate():
     if 'image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
@@ -60,44 +139,214 @@ def generate():
 
     try:
         unique_filename = generate_unique_filename(file.filename)
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(upload_path)
+        data = file.read()
+        image = MemePipeline.decode(data)
 
-        abs_upload_path = os.path.abspath(upload_path)
+        if image is None:
+            return jsonify({'error': 'Failed to read image'}), 400
+        print("image read successfully")
 
-        print(abs_upload_path)
+        if app.config['SAVE_UPLOADS']:
+            save_upload(data, unique_filename)
 
-        if abs_upload_path is None:
-            return jsonify({'error': 'Failed to read image'}), 500
-        print("image read successfully")
+        faces_mode = request.args.get('faces')
+        if faces_mode in ('each', 'composite'):
+            result = pipeline.run_multi(image, composite=faces_mode == 'composite')
+            base = os.path.splitext(unique_filename)[0]
+            memes = []
+            for i, meme in enumerate(result['memes']):
+                suffix = 'all' if result['composite'] else f'face{i + 1}'
+                processed_filename = save_processed(meme, f"{base}_{suffix}.jpg")
+                memes.append(f"/static/processed/{processed_filename}")
 
-        meme, output_path = generate_meme(
-            abs_upload_path,
-            font_path=font_path,
-            predictor_path=predictor_path,
-        )
+            return jsonify({
+                'processed': memes[0],
+                'memes': memes,
+                'faces': result['faces']
+            })
 
-        meme_img = np.array(meme)
-        meme_img = cv2.cvtColor(meme_img, cv2.COLOR_RGB2BGR)
-        is_success, buffer = cv2.imencode(".jpg", meme_img)
-        if not is_success:
-            return jsonify({'error': 'Failed to generate image'}), 500
+        if request.args.get('inline') == '1':
+            result = pipeline.run(image)
+            return send_file(
+                BytesIO(MemePipeline.encode(result['meme'])),
+                mimetype='image/jpeg',
+                download_name=f"meme_{os.path.splitext(unique_filename)[0]}.jpg"
+            )
 
-        io_buf = BytesIO(buffer)
-        io_buf.seek(0)
+        if request.args.get('async') == '1':
+            try:
+                job_id = job_queue.submit(process_upload, image, unique_filename)
+            except JobQueueFull as e:
+                return jsonify({'error': str(e)}), 503
 
-        processed_filename = f"meme_{unique_filename}"
-        processed_path = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
-        cv2.imwrite(processed_path, meme_img)
+            return jsonify({
+                'job_id': job_id,
+                'status': f"/jobs/{job_id}",
+                'events': f"/jobs/{job_id}/events"
+            }), 202
 
-        return jsonify({
-            'original': f"/static/uploads/{unique_filename}",
-            'processed': f"/static/processed/{processed_filename}"
-        })
+        return jsonify(process_upload(image, unique_filename))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def save_upload(data, unique_filename):
+    upload_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    with open(upload_path, 'wb') as f:
+        f.write(data)
+
+def save_processed(meme, unique_filename):
+    processed_filename = f"meme_{os.path.splitext(unique_filename)[0]}.jpg"
+    processed_path = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
+    with open(processed_path, 'wb') as f:
+        f.write(MemePipeline.encode(meme))
+    return processed_filename
+
+def process_upload(image, unique_filename):
+    result = pipeline.run(image)
+    return meme_response(result, unique_filename)
+
+def meme_response(result, unique_filename):
+    processed_filename = save_processed(result['meme'], unique_filename)
+
+    response = {
+        'processed': f"/static/processed/{processed_filename}",
+        'partial_fusion': result['partial']
+    }
+    if app.config['SAVE_UPLOADS']:
+        response['original'] = f"/uploads/{unique_filename}"
+    return response
+
+def job_response(job):
+    response = {'job_id': job['id'], 'status': job['status']}
+    if job['status'] == 'done':
+        response.update(job['result'])
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        status = None
+        while True:
+            job = job_queue.wait(job_id, last_status=status, timeout=15)
+            if job is None:
+                yield f"data: {json.dumps({'job_id': job_id, 'status': 'expired'})}\n\n"
+                return
+            if job['status'] == status:
+                yield ": keep-alive\n\n"
+                continue
+            status = job['status']
+            yield f"data: {json.dumps(job_response(job))}\n\n"
+            if status in ('done', 'failed'):
+                return
+
+    return Response(stream(), mimetype='text/event-stream')
+
+@app.route('/generate_batch', methods=['POST'])
+@requires_pipeline
+def generate_batch():
+    files = [f for f in request.files.getlist('images') if f.filename != '']
+    if not files:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    if not all(allowed_file(f.filename) for f in files):
+        return jsonify({'error': 'File format not supported'}), 400
+
+    try:
+        unique_filenames = []
+        images = []
+        for file in files:
+            unique_filename = generate_unique_filename(file.filename)
+            data = file.read()
+            image = MemePipeline.decode(data)
+            if image is None:
+                return jsonify({'error': f'Failed to read image {file.filename}'}), 400
+
+            if app.config['SAVE_UPLOADS']:
+                save_upload(data, unique_filename)
+            unique_filenames.append(unique_filename)
+            images.append(image)
+
+        results = pipeline.run_batch(images)
+        memes = [meme_response(result, unique_filename)
+                 for unique_filename, result in zip(unique_filenames, results)]
+
+        return jsonify({'memes': memes})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/similar', methods=['POST'])
+def similar():
+    # query by an emotion vector (JSON body) or by an uploaded image (form)
+    params = request.get_json(silent=True) or request.form
+    try:
+        k = min(int(params.get('k', 10)), app.config['SIMILAR_MAX_K'])
+        min_age = params.get('min_age')
+        max_age = params.get('max_age')
+        filters = {
+            'gender': params.get('gender'),
+            'country': params.get('country'),
+            'min_age': float(min_age) if min_age not in (None, '') else None,
+            'max_age': float(max_age) if max_age not in (None, '') else None,
+        }
+
+        if 'image' in request.files:
+            unavailable = ensure_pipeline()
+            if unavailable is not None:
+                return unavailable
+            image = MemePipeline.decode(request.files['image'].read())
+            if image is None:
+                return jsonify({'error': 'Failed to read image'}), 400
+            emotion_result = pipeline.analyze_emotions(image)
+            if emotion_result is None:
+                return jsonify({'error': 'No human face detected'}), 422
+            query = emotion_result.scores
+        elif params.get('emotions') is not None:
+            emotions = params['emotions']
+            query = emotion_vector(json.loads(emotions) if isinstance(emotions, str) else emotions)
+        else:
+            return jsonify({'error': 'Provide an emotions vector or an image'}), 400
+
+        emotion_index.refresh()
+        results = emotion_index.search(query, k=k, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'query': dict(zip(EMOTION_LABELS, [round(float(p), 4) for p in emotion_vector(query)])),
+        'indexed_faces': len(emotion_index),
+        'results': results,
+    })
+
+@app.route('/stats')
+@requires_pipeline
+def stats():
+    emotion_detector = pipeline.emotion_detector
+    return jsonify({
+        'cascade': emotion_detector.get_cascade_stats(),
+        'emotion_cache': emotion_detector.cache.get_stats() if emotion_detector.cache else None,
+        'caption_pool': pipeline.caption_pool.get_stats() if pipeline.caption_pool else None,
+        'caption_render_cache': pipeline.meme_generator.get_render_cache_stats(),
+        'job_queue': {'depth': job_queue.depth(), 'max_depth': app.config['JOB_QUEUE_DEPTH']},
+    })
+
+@app.route('/uploads/<path:filename>')
+def upload_files(filename):
+    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     return send_from_directory('static', filename)
@@ -0,0 +1,59 @@
+import glob
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.meme_generator import MemeGenerator, dominant_colors
+
+
+def kmeans_dominant_color(pixels, k=1):
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=k, n_init=10)
+    kmeans.fit(pixels)
+
+    counts = Counter(kmeans.labels_)
+    dominant_color = kmeans.cluster_centers_[counts.most_common(1)[0][0]]
+    return tuple(int(c) for c in dominant_color)
+
+
+def main(image_dir="core/dataset/images", limit=50, k=1):
+    paths = sorted(glob.glob(os.path.join(image_dir, "*", "*.jpg")))[:limit]
+    if not paths:
+        print(f"no images found in {image_dir}")
+        return
+
+    generator = MemeGenerator(None)
+    samples = [generator._get_corner_pixels(cv2.cvtColor(cv2.imread(p), cv2.COLOR_BGR2RGB)) for p in paths]
+
+    start = time.perf_counter()
+    kmeans_colors = [kmeans_dominant_color(pixels, k) for pixels in samples]
+    kmeans_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    numpy_colors = [dominant_colors(pixels, k)[0] for pixels in samples]
+    numpy_time = time.perf_counter() - start
+
+    distances = [np.linalg.norm(np.subtract(a, b)) for a, b in zip(kmeans_colors, numpy_colors)]
+    contrast_agree = sum(
+        generator._get_contrast_color(a) == generator._get_contrast_color(b)
+        for a, b in zip(kmeans_colors, numpy_colors)
+    )
+
+    print("=" * 50)
+    print(f"images: {len(samples)}, k={k}")
+    print(f"kmeans:    {kmeans_time * 1000 / len(samples):.3f} ms/image")
+    print(f"numpy:     {numpy_time * 1000 / len(samples):.3f} ms/image")
+    print(f"speedup:   {kmeans_time / numpy_time:.1f}x")
+    print(f"mean RGB distance to kmeans: {np.mean(distances):.1f}")
+    print(f"same contrast colour: {contrast_agree}/{len(samples)}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
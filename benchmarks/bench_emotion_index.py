@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.emotion_index import EmotionIndex
+
+
+def synthetic_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    scores = rng.dirichlet(np.full(7, 0.5), size=n).astype(np.float32)
+    genders = rng.choice(["MALE", "FEMALE"], size=n)
+    ages = rng.integers(18, 70, size=n)
+    countries = rng.choice(["RU", "US", "CN", "IN", "BR"], size=n)
+    return [
+        (i + 1, 0, scores[i].tobytes(), f"dataset/images/{i}.jpg", genders[i], int(ages[i]), countries[i])
+        for i in range(n)
+    ]
+
+
+def main(n=100000, queries=200, k=10):
+    n = int(n)
+    index = EmotionIndex.__new__(EmotionIndex)
+    start = time.perf_counter()
+    index._data = EmotionIndex.from_rows(synthetic_rows(n))
+    build = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    query_vectors = rng.dirichlet(np.full(7, 0.5), size=queries)
+
+    print("=" * 50)
+    print(f"faces: {n}, queries: {queries}, k={k}, build {build:.2f}s")
+    for name, filters in (("no filter", {}),
+                          ("gender+age", {"gender": "female", "min_age": 25, "max_age": 40}),
+                          ("country", {"country": "ru"})):
+        start = time.perf_counter()
+        for query in query_vectors:
+            index.search(query, k=k, **filters)
+        elapsed = (time.perf_counter() - start) / queries
+        print(f"{name:11s} {elapsed * 1000:.2f} ms/query")
+
+    # brute-force check of the first query against a full sort
+    query = query_vectors[0] / np.linalg.norm(query_vectors[0])
+    expected = np.argsort(1.0 - index._data["vectors"] @ query, kind="stable")[:k] + 1
+    got = [r["image_id"] for r in index.search(query_vectors[0], k=k)]
+    print(f"matches full sort: {list(expected) == got}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,89 @@
+import glob
+import os
+import sys
+import tracemalloc
+import cv2
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.frame_context import FrameContext
+from core.pipeline import MemePipeline
+
+counts = {"cvtColor": 0, "fromarray": 0}
+_cvt_color = cv2.cvtColor
+_fromarray = Image.fromarray
+
+
+def counting_cvt_color(*args, **kwargs):
+    counts["cvtColor"] += 1
+    return _cvt_color(*args, **kwargs)
+
+
+def counting_fromarray(*args, **kwargs):
+    counts["fromarray"] += 1
+    return _fromarray(*args, **kwargs)
+
+
+def run_stages(pipeline, image, shared):
+    # shared=False hands every stage the raw array, as before FrameContext
+    frame = FrameContext(image) if shared else None
+    source = frame if shared else image
+
+    faces = pipeline.face_utils.detect_faces(source)
+    if not faces:
+        return None
+    face = faces[0]
+    landmarks = pipeline.face_utils.get_landmarks(source, face)
+    pipeline.emotion_detector.detect_emotion(source, face)
+    pipeline.meme_generator.create_meme(source, face, landmarks, "哈哈哈哈")
+    return frame
+
+
+def measure(pipeline, images, shared):
+    counts["cvtColor"] = counts["fromarray"] = 0
+    if pipeline.emotion_detector.cache is not None:
+        pipeline.emotion_detector.cache.clear()
+
+    tracemalloc.start()
+    frames = [run_stages(pipeline, image, shared) for image in images]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(counts), peak, [f for f in frames if f is not None]
+
+
+def main(image_dir="core/dataset/images", limit=10):
+    paths = sorted(glob.glob(os.path.join(image_dir, "*", "*.jpg")))[:limit]
+    images = [cv2.imread(p) for p in paths]
+    if not images:
+        print(f"no images found in {image_dir}")
+        return
+
+    pipeline = MemePipeline(caption_pool=False)
+    pipeline.warm_up()
+
+    cv2.cvtColor = counting_cvt_color
+    Image.fromarray = counting_fromarray
+    try:
+        before, before_peak, _ = measure(pipeline, images, shared=False)
+        after, after_peak, frames = measure(pipeline, images, shared=True)
+    finally:
+        cv2.cvtColor = _cvt_color
+        Image.fromarray = _fromarray
+
+    allocations = {}
+    for frame in frames:
+        for key, n in frame.allocations.items():
+            allocations[key] = allocations.get(key, 0) + n
+
+    print("=" * 50)
+    print(f"images: {len(images)}")
+    print(f"raw arrays:    {before}, peak traced memory {before_peak / 1024 / 1024:.1f} MB")
+    print(f"FrameContext:  {after}, peak traced memory {after_peak / 1024 / 1024:.1f} MB")
+    print(f"FrameContext allocations: {allocations}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,126 @@
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.DatabaseManager import DatabaseManager
+from core.database import UserDB
+
+
+class UnpooledDB:
+    # the previous access pattern: a private connection per caller with the
+    # default rollback journal and a commit after every insert
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def get_image_by_id(self, image_id):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            row = conn.execute("SELECT image_path FROM images WHERE id=?", (image_id,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def validate_user(self, username, password):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            return conn.execute("SELECT * FROM users WHERE username=? AND password=?",
+                                (username, password)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def add_user(self, username, password):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("INSERT INTO users (username, password, register_date) VALUES (?, ?, ?)",
+                         (username, password, datetime.now()))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class PooledDB:
+    def __init__(self, db_path):
+        self.images = DatabaseManager(db_path)
+        self.users = UserDB(db_path)
+
+    def get_image_by_id(self, image_id):
+        return self.images.get_image_by_id(image_id)
+
+    def validate_user(self, username, password):
+        return self.users.validate_user(username, password)
+
+    def add_user(self, username, password):
+        self.users.add_user(username, password)
+
+
+def worker(db, name, ops, write_ratio, max_id, counts):
+    rng = random.Random(name)
+    reads = writes = 0
+    for i in range(ops):
+        if rng.random() < write_ratio:
+            db.add_user(f"{name}-{i}", "secret")
+            writes += 1
+        elif i % 2:
+            db.get_image_by_id(rng.randint(1, max_id))
+            reads += 1
+        else:
+            db.validate_user(f"{name}-{rng.randint(0, max(0, i - 1))}", "secret")
+            reads += 1
+    counts.append((reads, writes))
+
+
+def run(db_class, db_path, threads, ops, write_ratio, max_id):
+    db = db_class(db_path)
+    counts = []
+    workers = [
+        threading.Thread(target=worker, args=(db, f"{db_class.__name__}-{t}", ops, write_ratio, max_id, counts))
+        for t in range(threads)
+    ]
+
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    reads = sum(r for r, _ in counts)
+    writes = sum(w for _, w in counts)
+    return elapsed, reads, writes
+
+
+def prepare(source, directory, name):
+    path = os.path.join(directory, name)
+    shutil.copyfile(source, path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, "
+                 "password TEXT, register_date TEXT)")
+    conn.commit()
+    max_id = conn.execute("SELECT MAX(id) FROM images").fetchone()[0] or 1
+    conn.close()
+    return path, max_id
+
+
+def main(source="core/dataset/emotions.sqlite", threads=8, ops=500, write_ratio=0.1):
+    # always work on copies so the shipped database is never switched to WAL
+    with tempfile.TemporaryDirectory() as directory:
+        print("=" * 50)
+        print(f"threads: {threads}, ops/thread: {ops}, write ratio: {write_ratio}")
+        for db_class in (UnpooledDB, PooledDB):
+            path, max_id = prepare(source, directory, f"{db_class.__name__}.sqlite")
+            elapsed, reads, writes = run(db_class, path, threads, ops, write_ratio, max_id)
+            print(f"{db_class.__name__:11s} {elapsed:.2f}s  "
+                  f"{(reads + writes) / elapsed:.0f} ops/s  ({reads} reads, {writes} writes)")
+        print("=" * 50)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
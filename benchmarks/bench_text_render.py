@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.meme_generator import load_font, render_text_mask, composite_text
+from core.text_library import TEXT_LIBRARY
+
+
+def offset_outline(pil_img, text, position, font, fill, outline_color, vertical):
+    # the previous renderer: eight offset draws for the outline plus the fill,
+    # repeated per character for vertical captions
+    draw = ImageDraw.Draw(pil_img)
+    x, y = position
+    for chunk in (list(text) if vertical else [text]):
+        for dx in (-2, 0, 2):
+            for dy in (-2, 0, 2):
+                if dx != 0 or dy != 0:
+                    draw.text((x + dx, y + dy), chunk, font=font, fill=outline_color, anchor='lt')
+        draw.text((x, y), chunk, font=font, fill=fill, anchor='lt')
+        y += font.size if vertical else 0
+
+
+def mask_outline(pil_img, text, position, font, fill, outline_color, vertical):
+    mask, origin = render_text_mask(text, font, vertical)
+    composite_text(pil_img, position, mask, origin, fill, outline_color)
+
+
+def measure(render, texts, font, vertical, repeat=3):
+    canvas = Image.new("RGB", (1200, 1200), (90, 120, 150))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            render(canvas, text, (20, 20), font, (255, 255, 255), (0, 0, 0), vertical)
+    return (time.perf_counter() - start) / (repeat * len(texts))
+
+
+def difference(texts, font, vertical):
+    diffs = []
+    for text in texts:
+        a = Image.new("RGB", (1200, 1200), (90, 120, 150))
+        b = a.copy()
+        offset_outline(a, text, (20, 20), font, (255, 255, 255), (0, 0, 0), vertical)
+        mask_outline(b, text, (20, 20), font, (255, 255, 255), (0, 0, 0), vertical)
+        a, b = np.asarray(a, dtype=np.int16), np.asarray(b, dtype=np.int16)
+        # only pixels either renderer touched, so the empty canvas does not dilute it
+        touched = ((a != (90, 120, 150)) | (b != (90, 120, 150))).any(axis=2)
+        diffs.append(np.abs(a - b)[touched].mean())
+    return np.mean(diffs)
+
+
+def main(font_path="core/assets/fonts/Bian.otf", font_size=48):
+    font = load_font(font_path, font_size)
+    texts = [text for captions in TEXT_LIBRARY.values() for text in captions][:60]
+
+    print("=" * 50)
+    print(f"captions: {len(texts)}, font size {font_size}")
+    for vertical in (False, True):
+        before = measure(offset_outline, texts, font, vertical)
+        after = measure(mask_outline, texts, font, vertical)
+        name = "vertical" if vertical else "horizontal"
+        print(f"{name:10s} offsets: {before * 1000:.3f} ms  mask: {after * 1000:.3f} ms  "
+              f"speedup: {before / after:.1f}x  mean diff on text pixels: {difference(texts, font, vertical):.2f}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,60 @@
+import glob
+import os
+import sys
+import time
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.face_utils import FaceUtils
+from core.emotion_detector import EmotionDetector
+
+
+def rounded(result):
+    return [(e, round(p, 3)) for e, p in zip(result.emotions, result.percentages)]
+
+
+def main(image_dir="core/dataset/images", limit=20, threads=8, rounds=5):
+    paths = sorted(glob.glob(os.path.join(image_dir, "*", "*.jpg")))[:limit]
+    face_utils = FaceUtils()
+    detector = EmotionDetector(cache_size=0)
+
+    samples = []
+    for path in paths:
+        image = cv2.imread(path)
+        faces = face_utils.detect_faces(image)
+        if faces:
+            samples.append((path, image, faces[0]))
+    if not samples:
+        print(f"no faces found in {image_dir}")
+        return
+
+    expected = {path: rounded(detector.detect_emotion(image, face)) for path, image, face in samples}
+
+    def check(sample):
+        path, image, face = sample
+        return path, rounded(detector.detect_emotion(image, face))
+
+    jobs = samples * rounds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(check, jobs))
+    elapsed = time.perf_counter() - start
+
+    mismatches = [(path, got, expected[path]) for path, got in results if got != expected[path]]
+
+    print("=" * 50)
+    print(f"faces: {len(samples)}, requests: {len(jobs)}, threads: {threads}")
+    print(f"throughput: {len(jobs) / elapsed:.1f} requests/s")
+    print(f"mismatches: {len(mismatches)}")
+    for path, got, want in mismatches[:10]:
+        print(f"   • {path}: got {got}, expected {want}")
+    print("=" * 50)
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
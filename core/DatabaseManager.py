@@ -1,41 +1,51 @@
-import sqlite3
-from PIL import Image
-import io
 import os
+from core.db_pool import get_pool
 
 
 class DatabaseManager:
+    GET_IMAGE_BY_ID = "SELECT image_path FROM images WHERE id=?"
+    SEARCH_IMAGES = "SELECT id, image_path FROM images WHERE image_path LIKE ?"
+    ALL_IMAGES = "SELECT image_path FROM images"
+    IMAGE_ROWS = "SELECT id, image_path FROM images ORDER BY id"
+    RANDOM_IMAGE = "SELECT image_path FROM images ORDER BY RANDOM() LIMIT 1"
+
     def __init__(self, db_path: str = 'default.sqlite'):
 
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.pool = None
 
         self._connect()
 
     def _connect(self):
         try:
-            if not os.path.exists(os.path.dirname(self.db_path)):
-                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-                self._initialize_db()
+            directory = os.path.dirname(self.db_path)
+            is_new = bool(directory) and not os.path.exists(directory)
 
-            self.conn = sqlite3.connect(self.db_path)
-            self.cursor = self.conn.cursor()
+            self.pool = get_pool(self.db_path)
+            self.pool.connection()
+
+            if is_new:
+                self._initialize_db()
 
         except Exception as e:
             raise ConnectionError(f"failed to connect database {self.db_path}: {str(e)}")
 
+    @property
+    def conn(self):
+        # the calling thread's own connection
+        return self.pool.connection()
+
     def _initialize_db(self):
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            tags TEXT,
-            image_data BLOB NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        self.conn.commit()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                tags TEXT,
+                image_data BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
 
     def switch_database(self, new_db_path: str):
         self.close()
@@ -43,32 +53,29 @@ class DatabaseManager:
         self._connect()
 
     def get_all_images_metadata(self):
-        self.cursor.execute("SELECT image_path FROM images")
-        return self.cursor.fetchall()
+        return self.pool.execute(self.ALL_IMAGES).fetchall()
 
     def get_image_by_id(self, image_id):
-        self.cursor.execute("SELECT image_path FROM images WHERE id=?", (image_id,))
-        image_path = self.cursor.fetchone()[0]
-        return image_path
+        row = self.pool.execute(self.GET_IMAGE_BY_ID, (image_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_image_rows(self):
+        return self.pool.execute(self.IMAGE_ROWS).fetchall()
+
+    def get_random_image(self):
+        row = self.pool.execute(self.RANDOM_IMAGE).fetchone()
+        return row[0] if row else None
 
     def search_images(self, keyword):
-        self.cursor.execute(
-            "SELECT id, image_path FROM images WHERE image_path LIKE ?",
-            (f'%{keyword}%',)
-        )
-        return self.cursor.fetchall()
+        return self.pool.execute(self.SEARCH_IMAGES, (f'%{keyword}%',)).fetchall()
 
     def close(self):
-        if self.conn:
-            self.conn.close()
-            self.conn = None
-            self.cursor = None
+        # connections belong to the shared pool; only this thread's is closed
+        if self.pool is not None:
+            self.pool.release()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
-
-    def __del__(self):
-        self.conn.close()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core.image_database import IMAGE_EXTENSIONS
+from core.meme_generator import DEFAULT_FONT_PATH
+
+
+CHECKPOINT = "checkpoint.jsonl"
+# errors are left out so a resumed run retries them; missing rows are only
+# retried once their file is back
+FINISHED = ("ok", "no_face", "missing")
+
+_pipeline = None
+
+
+def images_from_db(db_path):
+    """(key, image_path, output_name) for every indexed image, in id order."""
+    from core.DatabaseManager import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    # dataset filenames repeat across set folders, so the id keeps names unique
+    return [
+        (str(image_id), image_path, f"meme_{image_id}_{os.path.basename(image_path)}")
+        for image_id, image_path in db.get_image_rows()
+    ]
+
+
+def images_from_dir(directory):
+    """(key, image_path, output_name) for every image below directory."""
+    items = []
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    relative = os.path.relpath(entry.path, directory)
+                    items.append((relative, entry.path, "meme_" + relative.replace(os.sep, "_")))
+    return sorted(items)
+
+
+def read_checkpoint(path):
+    """Keys already finished by an earlier run, by their latest record; a line
+    cut off by a crash is ignored."""
+    latest = {}
+    if not os.path.exists(path):
+        return latest
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            latest[record["key"]] = record
+    return {key: record for key, record in latest.items() if record["status"] in FINISHED}
+
+
+def _init_worker(options):
+    # each worker process loads the models once and keeps them for every chunk
+    global _pipeline
+    from core.pipeline import MemePipeline
+    from core.feature_store import FeatureStore
+
+    _pipeline = MemePipeline(
+        font_path=options["font_path"],
+        predictor_path=options["predictor_path"],
+        llm_model=options["llm_model"],
+        caption_pool=options["caption_pool"],
+    )
+    if _pipeline.load_error:
+        raise RuntimeError(_pipeline.load_error)
+    _pipeline.warm_up()
+    if options["feature_db"]:
+        _pipeline.feature_store = FeatureStore(options["feature_db"])
+
+
+def _record(key, result, error=None):
+    if error is not None:
+        return {"key": key, "status": "error", "output": None, "error": str(error)}
+    if result["output_path"] is None:
+        return {"key": key, "status": "no_face", "output": None}
+    return {"key": key, "status": "ok", "output": result["output_path"], "text": result["text"]}
+
+
+def _process_chunk(chunk):
+    paths = [image_path for _, image_path, _ in chunk]
+    output_paths = [output_path for _, _, output_path in chunk]
+    try:
+        results = _pipeline.run_batch(paths, output_paths=output_paths)
+        records = [_record(key, result) for (key, _, _), result in zip(chunk, results)]
+    except Exception:
+        # one bad image fails the whole batch; redo the chunk image by image
+        records = []
+        for key, image_path, output_path in chunk:
+            try:
+                records.append(_record(key, _pipeline.run(image_path, output_path)))
+            except Exception as e:
+                records.append(_record(key, None, e))
+    return records, _pipeline.pop_stage_times()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def report(stage_times, stage_counts, done, total, elapsed):
+    print("=" * 50)
+    print(f"{done}/{total} images in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.2f} images/s overall)")
+    for name in ("read", "features", "detect", "emotion", "landmarks", "caption", "render", "save"):
+        if stage_counts[name]:
+            # summed over workers, so this is per-worker throughput of the stage
+            print(f"   • {name:9s} {stage_counts[name] / stage_times[name]:8.1f} images/s "
+                  f"({stage_times[name]:.1f}s for {stage_counts[name]})")
+    print("=" * 50)
+
+
+def run(items, output_dir, workers=None, chunk_size=16, restart=False, options=None):
+    """Generate a meme for every item not yet in output_dir's checkpoint, a
+    chunk per task over a process pool. Each finished chunk is appended to the
+    checkpoint before the next is taken, so an interrupted run resumes there."""
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = os.path.join(output_dir, CHECKPOINT)
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    paths = {key: image_path for key, image_path, _ in items}
+    done = {
+        key: record for key, record in read_checkpoint(checkpoint).items()
+        if record["status"] != "missing" or not os.path.exists(paths.get(key, ""))
+    }
+    todo = [
+        (key, image_path, os.path.join(output_dir, name))
+        for key, image_path, name in items if key not in done
+    ]
+    print(f"{len(items)} images, {len(items) - len(todo)} already done, {len(todo)} to go...")
+    statuses = Counter(record["status"] for record in done.values())
+    if not todo:
+        return statuses
+
+    # the index keeps rows for deleted files unless it is pruned; those are
+    # recorded as missing instead of failing in a worker on every run
+    missing = [item for item in todo if not os.path.exists(item[1])]
+    if missing:
+        print(f"{len(missing)} indexed images no longer exist, skipping them...")
+        todo = [item for item in todo if os.path.exists(item[1])]
+
+    workers = workers or os.cpu_count() or 1
+    stage_times, stage_counts = Counter(), Counter()
+    finished = 0
+    start = time.perf_counter()
+
+    with open(checkpoint, "a", encoding="utf-8") as log:
+        for key, _, _ in missing:
+            log.write(json.dumps({"key": key, "status": "missing", "output": None}) + "\n")
+            statuses["missing"] += 1
+        log.flush()
+        if not todo:
+            return statuses
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(options,)) as executor:
+            futures = [executor.submit(_process_chunk, chunk) for chunk in _chunks(todo, chunk_size)]
+            for future in as_completed(futures):
+                records, timings = future.result()
+                for record in records:
+                    log.write(json.dumps(record) + "\n")
+                    statuses[record["status"]] += 1
+                log.flush()
+                os.fsync(log.fileno())
+
+                for name, (seconds, count) in timings.items():
+                    stage_times[name] += seconds
+                    stage_counts[name] += count
+                finished += len(records)
+                print(f"{finished}/{len(todo)} memes done...")
+
+    report(stage_times, stage_counts, finished, len(todo), time.perf_counter() - start)
+    return statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate memes for a whole dataset or directory.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="dataset/emotions.sqlite", help="image database to read rows from")
+    source.add_argument("--dir", help="directory to scan for images instead of the database")
+    parser.add_argument("--output-dir", default="output/batch")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="images per task")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--font-path", default=DEFAULT_FONT_PATH)
+    parser.add_argument("--predictor-path", default="assets/models/shape_predictor_68_face_landmarks.dat")
+    parser.add_argument("--llm-model", default="deepseek-chat")
+    parser.add_argument("--no-caption-pool", action="store_true", help="call the LLM for every caption")
+    parser.add_argument("--use-features", action="store_true",
+                        help="reuse features precomputed into --db by core.feature_store")
+    args = parser.parse_args(argv)
+
+    items = images_from_dir(args.dir) if args.dir else images_from_db(args.db)
+    options = {
+        "font_path": args.font_path,
+        "predictor_path": args.predictor_path,
+        "llm_model": args.llm_model,
+        "caption_pool": not args.no_caption_pool,
+        "feature_db": args.db if args.use_features and not args.dir else None,
+    }
+    statuses = run(items, args.output_dir, args.workers, args.chunk_size, args.restart, options)
+    print(", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    main()
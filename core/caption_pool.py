@@ -0,0 +1,122 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from core.text_library import get_random_text
+
+
+def quantize_emotions(emotions, percentages, top_k=2, step=0.1):
+    pairs = sorted(zip(emotions, percentages), key=lambda x: x[1], reverse=True)[:top_k]
+    if not pairs:
+        return (("neutral", 1.0),)
+
+    buckets = int(round(1 / step))
+    total = sum(p for _, p in pairs) or 1.0
+    key = tuple((e, round(round(p / total * buckets) / buckets, 2)) for e, p in pairs)
+    # a runner-up that rounds to 0 would split ("happy", 1.0) into one bucket per
+    # negligible second emotion; the top emotion is always kept
+    return key[:1] + tuple(pair for pair in key[1:] if pair[1] > 0)
+
+
+class CaptionPool:
+    def __init__(self, text_generator, pool_size=4, ttl=3600, max_buckets=128,
+                 workers=2, top_k=2, step=0.1):
+        self.text_generator = text_generator
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self.max_buckets = max_buckets
+        self.top_k = top_k
+        self.step = step
+
+        self.pools = OrderedDict()
+        self.refilling = set()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "generated": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="caption")
+
+    def bucket(self, emotions, percentages):
+        return quantize_emotions(emotions, percentages, self.top_k, self.step)
+
+    def _pool(self, key):
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = deque()
+            while len(self.pools) > self.max_buckets:
+                self.pools.popitem(last=False)
+        self.pools.move_to_end(key)
+        return pool
+
+    def _take(self, key):
+        now = time.time()
+        pool = self._pool(key)
+        while pool:
+            text, created_at = pool.popleft()
+            if now - created_at <= self.ttl:
+                return text
+            self.stats["expired"] += 1
+        return None
+
+    def _refill(self, key):
+        if not getattr(self.text_generator, "client", None):
+            with self._lock:
+                self.refilling.discard(key)
+            return
+
+        emotions = [e for e, _ in key]
+        percentages = [p for _, p in key]
+
+        try:
+            while True:
+                with self._lock:
+                    if key not in self.pools or len(self.pools[key]) >= self.pool_size:
+                        return
+
+                text = self.text_generator.generate_caption(emotions, percentages)
+                if not text:
+                    with self._lock:
+                        self.stats["failed"] += 1
+                    return
+
+                with self._lock:
+                    if key in self.pools:
+                        self.pools[key].append((text, time.time()))
+                    self.stats["generated"] += 1
+        finally:
+            with self._lock:
+                self.refilling.discard(key)
+
+    def schedule_refill(self, key):
+        with self._lock:
+            if key in self.refilling:
+                return
+            self._pool(key)
+            self.refilling.add(key)
+        self._executor.submit(self._refill, key)
+
+    def prefill(self, distributions):
+        for emotions, percentages in distributions:
+            self.schedule_refill(self.bucket(emotions, percentages))
+
+    def get_caption(self, emotions, percentages):
+        key = self.bucket(emotions, percentages)
+
+        with self._lock:
+            text = self._take(key)
+            if text is not None:
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+
+        self.schedule_refill(key)
+
+        if text is None:
+            print(f"caption pool empty for {key}, using text library...")
+            return get_random_text(key[0][0])
+        return text
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["buckets"] = len(self.pools)
+            stats["ready"] = sum(len(pool) for pool in self.pools.values())
+        return stats
@@ -1,32 +1,40 @@
-import sqlite3
 from datetime import datetime
+from core.db_pool import get_pool
 
 
 class UserDB:
+    INSERT_USER = '''
+        INSERT INTO users (username, password, register_date)
+        VALUES (?, ?, ?)'''
+    VALIDATE_USER = '''
+        SELECT 1 FROM users WHERE username=? AND password=? LIMIT 1'''
+
     def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path)
+        self.pool = get_pool(db_path)
         self._create_table()
 
     def _create_table(self):
-        self.conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE,
-            password TEXT,
-            register_date TEXT
-        )''')
-        self.conn.commit()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                username TEXT UNIQUE,
+                password TEXT,
+                register_date TEXT
+            )''')
 
     def add_user(self, username, password):
-        self.conn.execute('''
-        INSERT INTO users (username, password, register_date)
-        VALUES (?, ?, ?)''', (username, password, datetime.now()))
-        self.conn.commit()
+        with self.pool.transaction() as conn:
+            conn.execute(self.INSERT_USER, (username, password, datetime.now()))
+
+    def add_users(self, users):
+        # one transaction (one WAL commit) for the whole batch
+        now = datetime.now()
+        with self.pool.transaction() as conn:
+            conn.executemany(self.INSERT_USER, [(username, password, now) for username, password in users])
 
     def validate_user(self, username, password):
-        cursor = self.conn.execute('''
-        SELECT * FROM users WHERE username=? AND password=?''',
-                                   (username, password))
+        cursor = self.pool.execute(self.VALIDATE_USER, (username, password))
         return cursor.fetchone() is not None
 
 
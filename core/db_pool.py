@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **kwargs):
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_path, **kwargs)
+        return _pools[key]
+
+
+class _ThreadConnection:
+    # sqlite3.Connection cannot be weakly referenced, so each thread holds its
+    # connection through this wrapper; when the thread exits its locals are
+    # dropped and the finalizer closes the connection
+    __slots__ = ("conn", "close", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.close = weakref.finalize(self, conn.close)
+
+
+class ConnectionPool:
+    """One sqlite3 connection per thread for a database file, opened on first
+    use with WAL and the pragmas above. Each connection caches compiled
+    statements by SQL text, so constant query strings are prepared once.
+    A connection lives as long as its thread: threads that exit (one per
+    request under Flask's threaded server) close theirs."""
+
+    def __init__(self, db_path, timeout=5.0, cached_statements=128, pragmas=PRAGMAS):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self):
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = self._local.holder = _ThreadConnection(self._open())
+            with self._lock:
+                self._connections.add(holder)
+        return holder.conn
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two writers wait on
+        # busy_timeout instead of failing to upgrade a read lock mid-transaction
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def release(self):
+        """Close the calling thread's connection; the next call reopens it."""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            self._local.holder = None
+            with self._lock:
+                self._connections.discard(holder)
+            holder.close()
+
+    def close_all(self):
+        with self._lock:
+            holders, self._connections = list(self._connections), weakref.WeakSet()
+        for holder in holders:
+            holder.close()
+        self._local = threading.local()
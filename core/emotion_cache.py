@@ -0,0 +1,71 @@
+import threading
+import cv2
+import numpy as np
+from collections import OrderedDict
+
+
+class EmotionCache:
+    def __init__(self, max_size=512, max_distance=4, hash_size=8):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def face_hash(self, face_image):
+        if face_image.ndim == 3:
+            face_image = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
+
+        small = cv2.resize(face_image, (self.hash_size + 1, self.hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int(np.packbits(bits).tobytes().hex(), 16)
+
+    @staticmethod
+    def hamming_distance(a, b):
+        return bin(a ^ b).count("1")
+
+    def get(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.entries[key]
+
+            best_key = None
+            best_distance = self.max_distance + 1
+            for other in self.entries:
+                distance = self.hamming_distance(key, other)
+                if distance < best_distance:
+                    best_key, best_distance = other, distance
+
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.stats["near_hits"] += 1
+            return self.entries[best_key]
+
+    def put(self, key, emotions, percentages):
+        with self._lock:
+            self.entries[key] = (list(emotions), list(percentages))
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.entries)
+
+        lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -1,16 +1,96 @@
 import time
+import threading
 import cv2
 import numpy as np
-from fer import FER
-from deepface import DeepFace
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from core.face_utils import FaceUtils
+from core.frame_context import FrameContext
+from core.emotion_cache import EmotionCache
+
+
+EMOTION_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+LABEL_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+# blank columns between faces in the batched FER strip; more than the 10 px
+# FER adds around each rectangle
+TILE_GAP = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_executor(max_workers=4):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="emotion")
+    return _executor
+
+
+def normalize_rows(scores):
+    totals = scores.sum(axis=-1, keepdims=True)
+    return np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+
+
+def ranking(scores, priority=None):
+    # slot order by descending score; equal scores go by descending priority,
+    # then by label order
+    if priority is None:
+        return np.argsort(-scores, axis=-1, kind="stable")
+    return np.lexsort((-np.broadcast_to(priority, scores.shape), -scores), axis=-1)
+
+
+def rank_mask(scores, n, kept=None, priority=None):
+    # True for the n highest scores of each row, restricted to kept slots
+    if kept is None:
+        kept = np.ones(scores.shape, dtype=bool)
+    order = ranking(np.where(kept, scores, -np.inf), priority)[..., :n]
+    mask = np.zeros(scores.shape, dtype=bool)
+    np.put_along_axis(mask, order, True, axis=-1)
+    return mask & kept
+
+
+def scores_to_lists(scores, kept=None, priority=None):
+    order = ranking(scores, priority)
+    if kept is not None:
+        order = order[kept[order]]
+    return [EMOTION_LABELS[i] for i in order], [float(scores[i]) for i in order]
+
+
+class EmotionResult:
+    def __init__(self, emotions, percentages, partial=False, missing=None, cached=False,
+                 retries=0, error=None, scores=None):
+        self.emotions = emotions
+        self.percentages = percentages
+        if scores is None:
+            scores = np.zeros(len(EMOTION_LABELS))
+            for e, p in zip(emotions, percentages):
+                scores[LABEL_INDEX[e]] += p
+        self.scores = scores
+        self.partial = partial
+        self.missing = missing or []
+        self.cached = cached
+        self.retries = retries
+        self.error = error
+
+    def __iter__(self):
+        return iter((self.emotions, self.percentages))
+
+    def __repr__(self):
+        return "EmotionResult({}, partial={})".format(
+            list(zip(self.emotions, self.percentages)), self.partial)
 
 
 class EmotionDetector:
     def __init__(self, primary_threshold=0.3, secondary_threshold=0.25,
-                 max_retries=3, top_n=3, primary_weight=0.5):
+                 max_retries=3, top_n=3, primary_weight=0.5, face_size=96,
+                 deadline=None, cascade=False, cache_size=512, cache_distance=4):
+
+        from fer import FER
+        from deepface import DeepFace
 
         self.primary_detector = FER(mtcnn=False)
+        self.deepface = DeepFace
         self.secondary_models = ["VGG-Face", "Facenet", "OpenFace"]
 
         self.primary_threshold = primary_threshold
@@ -19,8 +99,18 @@ class EmotionDetector:
         self.top_n = top_n
         self.primary_weight = primary_weight
         self.secondary_weight = 1 - primary_weight
-        self.last_valid_emotions = ["neutral"]
-        self.last_valid_percentages = [1.0]
+        self.face_size = face_size
+        # seconds from submitting the detector jobs, so time spent queued on
+        # the shared executor behind other requests counts against it
+        self.deadline = deadline
+        self.cascade = cascade
+        self.cascade_stats = {"secondary_called": 0, "secondary_skipped": 0}
+        self._stats_lock = threading.Lock()
+        self.cache = EmotionCache(cache_size, cache_distance) if cache_size else None
+        # FER's Keras model and DeepFace's model cache are shared by every
+        # request, so each backend is entered by one thread at a time
+        self._primary_lock = threading.Lock()
+        self._secondary_lock = threading.Lock()
 
         self.emotion_groups = {
             "positive": ["happy", "surprise"],
@@ -40,6 +130,15 @@ class EmotionDetector:
             for emotion in emotions:
                 self.group_mapping[emotion] = group
 
+        self.label_index = {e: LABEL_INDEX[std_e] for e, std_e in self.emotion_mapping.items()}
+        # one boolean row per non-neutral group; a face conflicts when its
+        # kept emotions touch more than one of them
+        self.polar_groups = [g for g in self.emotion_groups if g != "neutral"]
+        self.polar_masks = np.array([[label in self.emotion_groups[g] for label in EMOTION_LABELS]
+                                     for g in self.polar_groups])
+        self.neutral_mask = ~self.polar_masks.any(axis=0)
+        self.neutral_scores = self.neutral_mask / self.neutral_mask.sum()
+
     def get_emotion_group(self, emotion):
         return self.group_mapping.get(emotion, "neutral")
 
@@ -52,183 +151,393 @@ class EmotionDetector:
         non_neutral_groups = set(g for g in groups if g != "neutral")
         return len(non_neutral_groups) > 1
 
-    def resolve_group_conflict(self, emotions, percentages):
-        print("resolving emotion conflict...")
-        if not self.is_group_conflict(emotions):
-            print("no emotion conflict")
-            return emotions, percentages
+    def group_conflicts(self, kept):
+        return (kept[..., None, :] & self.polar_masks).any(axis=-1).sum(axis=-1) > 1
 
-        group_scores = defaultdict(float)
-        for e, p in zip(emotions, percentages):
-            group = self.get_emotion_group(e)
-            if group != "neutral":
-                group_scores[group] += p
+    def resolve_conflicts(self, scores, kept, priority=None):
+        conflict = self.group_conflicts(kept)
+        if not conflict.any():
+            return scores, kept
 
-        best_group = max(group_scores.items(), key=lambda x: x[1])[0]
-        print("emotions: ", emotions)
-        print("best group: ", best_group)
+        group_scores = np.where(kept, scores, 0.0) @ self.polar_masks.T
+        # a tie goes to the group of the highest-ranked emotion, as the list
+        # version did by taking groups in the order their emotions appeared
+        top = ranking(np.where(kept, scores, -np.inf), priority)[..., :1]
+        leading = np.moveaxis(self.polar_masks[:, top[..., 0]], 0, -1)
+        tied = group_scores == group_scores.max(axis=-1, keepdims=True)
+        preferred = tied & leading
+        best = np.where(preferred.any(axis=-1), preferred.argmax(axis=-1), tied.argmax(axis=-1))
+        allowed = self.polar_masks[best] | self.neutral_mask
 
-        filtered = []
-        filtered_p = []
-        for e, p in zip(emotions, percentages):
-            if self.get_emotion_group(e) == best_group or self.get_emotion_group(e) == "neutral":
-                filtered.append(e)
-                filtered_p.append(p)
+        filtered = kept & allowed
+        rescored = normalize_rows(np.where(filtered, scores, 0.0))
+        filtered = rank_mask(rescored, self.top_n, filtered, priority)
 
-        total = sum(filtered_p)
-        if total > 0:
-            filtered_p = [p / total for p in filtered_p]
-        print("filtered emotion conflict: ", filtered)
+        conflict = conflict[..., None]
+        return np.where(conflict, rescored, scores), np.where(conflict, filtered, kept)
 
-        return filtered[:self.top_n], filtered_p[:self.top_n]
+    def resolve_group_conflict(self, emotions, percentages):
+        scores, kept = self.lists_to_vector(emotions, percentages)
+        scores, kept = self.resolve_conflicts(scores, kept)
+        return scores_to_lists(scores, kept)
+
+    @staticmethod
+    def fusion_priority(primary, secondary):
+        """Tie-break order for fused scores: emotions the primary detector
+        reported rank first, by its score, then the secondary's."""
+        return np.where(primary > 0, 1.0 + primary, secondary)
+
+    def fuse_scores(self, primary, secondary):
+        """Fuse (N, 7) primary and secondary score matrices; an all-zero row means
+        that detector produced nothing for the face. Returns (scores, kept)."""
+        priority = self.fusion_priority(primary, secondary)
+        has_primary = primary.sum(axis=-1) > 0
+        has_secondary = secondary.sum(axis=-1) > 0
+        both = (has_primary & has_secondary)[..., None]
+
+        fused = np.where(both, primary * self.primary_weight + secondary * self.secondary_weight,
+                         np.where(has_primary[..., None], primary, secondary))
+        # a single detector keeps its top_n emotions, but never zero-score
+        # slots it did not report
+        kept = np.where(both, fused >= 0.2, rank_mask(fused, self.top_n, fused > 0, priority))
+
+        scores, kept = self.resolve_conflicts(fused, kept, priority)
+        scores = np.where(kept, scores, 0.0)
+        scores = np.where(both, normalize_rows(scores), scores)
+
+        neither = ~(has_primary | has_secondary)
+        scores[neither] = self.neutral_scores
+        kept[neither] = self.neutral_mask
+        return scores, kept
 
     def fuse_results(self, primary_emotions, primary_percentages,
                      secondary_emotions, secondary_percentages):
-        if not primary_emotions and not secondary_emotions:
-            return ["neutral"], [1.0]
-        elif not primary_emotions:
-            return self.resolve_group_conflict(
-                secondary_emotions[:self.top_n],
-                secondary_percentages[:self.top_n]
-            )
-        elif not secondary_emotions:
-            return self.resolve_group_conflict(
-                primary_emotions[:self.top_n],
-                primary_percentages[:self.top_n]
-            )
-
-        fused = defaultdict(float)
-        group_totals = defaultdict(float)
+        primary, _ = self.lists_to_vector(primary_emotions, primary_percentages)
+        secondary, _ = self.lists_to_vector(secondary_emotions, secondary_percentages)
+        scores, kept = self.fuse_scores(primary[None], secondary[None])
+        return scores_to_lists(scores[0], kept[0], self.fusion_priority(primary, secondary))
+
+    def lists_to_vector(self, emotions, percentages):
+        scores = np.zeros(len(EMOTION_LABELS))
+        kept = np.zeros(len(EMOTION_LABELS), dtype=bool)
+        for e, p in zip(emotions, percentages):
+            i = self.label_index.get(e.lower())
+            if i is not None:
+                scores[i] += p
+                kept[i] = True
+        return scores, kept
+
+    def standardize_scores(self, *score_dicts):
+        scores = np.zeros(len(EMOTION_LABELS))
+        for score_dict in score_dicts:
+            for e, c in score_dict.items():
+                i = self.label_index.get(e.lower())
+                if i is not None:
+                    scores[i] += c
+        return normalize_rows(scores)
 
-        for e, p in zip(primary_emotions, primary_percentages):
-            std_e = self.emotion_mapping.get(e.lower(), e.lower())
-            fused[std_e] += p * self.primary_weight
-            group_totals[self.get_emotion_group(std_e)] += p * self.primary_weight
+    def preprocess_face(self, face_roi):
+        gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
+        if not hasattr(_local, "clahe"):
+            _local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        enhanced = _local.clahe.apply(gray)
+        return cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
 
-        for e, p in zip(secondary_emotions, secondary_percentages):
-            std_e = self.emotion_mapping.get(e.lower(), e.lower())
-            fused[std_e] += p * self.secondary_weight
-            group_totals[self.get_emotion_group(std_e)] += p * self.secondary_weight
+    def prepare_face(self, face_crop):
+        crop, (x, y, w, h) = face_crop
+        size = self.face_size
+        if crop.shape[:2] == (size, size):
+            return crop, (x, y, w, h)
 
-        sorted_items = sorted(fused.items(), key=lambda x: x[1], reverse=True)
+        scale_x, scale_y = size / crop.shape[1], size / crop.shape[0]
+        resized = cv2.resize(crop, (size, size))
+        return resized, (int(x * scale_x), int(y * scale_y), int(w * scale_x), int(h * scale_y))
 
-        fused_emotions = []
-        fused_percentages = []
-        for e, p in sorted_items:
-            if p >= 0.2:
-                fused_emotions.append(e)
-                fused_percentages.append(p)
+    def detect_with_primary(self, face_crop):
+        return self.detect_with_primary_batch([face_crop])[0]
 
-        print("fused emotions: {}".format(fused_emotions))
+    def detect_with_secondary(self, face_crop):
+        try:
+            resized, _ = self.prepare_face(face_crop)
+            rgb_face = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
 
-        final_emotions, final_percentages = self.resolve_group_conflict(
-            fused_emotions, fused_percentages
-        )
+            with self._secondary_lock:
+                analysis = self.deepface.analyze(
+                    img_path=rgb_face,
+                    actions=['emotion'],
+                    enforce_detection=False,
+                    detector_backend='skip',
+                    silent=True,
+                )
 
-        total = sum(final_percentages)
-        if total > 0:
-            final_percentages = [p / total for p in final_percentages]
+            return self.standardize_scores(*[result['emotion'] for result in analysis])
 
-        return final_emotions, final_percentages
+        except Exception as e:
+            print(f"Error in secondary model detection: {str(e)}")
+            return np.zeros(len(EMOTION_LABELS))
 
-    def preprocess_face(self, face_roi):
-        gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(gray)
-        return cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
+    def detect_with_primary_batch(self, face_crops):
+        outputs = np.zeros((len(face_crops), len(EMOTION_LABELS)))
+        if not face_crops:
+            return outputs
+        size = self.face_size
 
-    def detect_with_primary(self, face_roi):
+        # FER widens every rectangle by its offsets before cropping, so tiles
+        # are spaced apart to keep one face from reading its neighbour's pixels
+        pitch = size + TILE_GAP
         try:
-            processed_face = self.preprocess_face(face_roi)
-            results = self.primary_detector.detect_emotions(processed_face)
+            strip = np.zeros((size, pitch * len(face_crops), 3), dtype=np.uint8)
+            rectangles = []
+            for i, face_crop in enumerate(face_crops):
+                resized, (x, y, w, h) = self.prepare_face(face_crop)
+                strip[:, i * pitch:i * pitch + size] = self.preprocess_face(resized)
+                rectangles.append((i * pitch + x, y, w, h))
 
-            if not results:
-                return [], []
+            with self._primary_lock:
+                results = self.primary_detector.detect_emotions(strip, face_rectangles=rectangles)
 
-            selected_region = max(results, key=lambda x: x['box'][2] * x['box'][3])
-            emotions = selected_region['emotions']
+            for result in results:
+                index = result['box'][0] // pitch
+                if 0 <= index < len(outputs):
+                    outputs[index] = self.standardize_scores(result['emotions'])
 
-            standardized = {}
-            for e, c in emotions.items():
-                std_e = self.emotion_mapping.get(e.lower(), e.lower())
-                standardized[std_e] = standardized.get(std_e, 0) + c
+        except Exception as e:
+            print(f"Error in primary model detection: {str(e)}")
 
-            sorted_items = sorted(standardized.items(), key=lambda x: x[1], reverse=True)
-            primary_emotions = [e for e, _ in sorted_items]
-            primary_percentages = [p for _, p in sorted_items]
+        return outputs
 
-            total = sum(primary_percentages)
-            if total > 0:
-                primary_percentages = [p / total for p in primary_percentages]
+    def detect_with_secondary_batch(self, face_crops):
+        if not face_crops:
+            return np.zeros((0, len(EMOTION_LABELS)))
 
-            return primary_emotions, primary_percentages
+        if len(face_crops) == 1:
+            return self.detect_with_secondary(face_crops[0])[None]
 
-        except Exception as e:
-            print(f"Error in primary model detection: {str(e)}")
-            return [], []
-
-    def detect_with_secondary(self, face_roi):
         try:
-            rgb_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2RGB)
-            combined = defaultdict(float)
-
-            try:
-                analysis = DeepFace.analyze(
-                    img_path=rgb_face,
+            rgb_faces = [cv2.cvtColor(self.prepare_face(face_crop)[0], cv2.COLOR_BGR2RGB)
+                         for face_crop in face_crops]
+            with self._secondary_lock:
+                analysis = self.deepface.analyze(
+                    img_path=rgb_faces,
                     actions=['emotion'],
-                    enforce_detection=True,
-                    detector_backend='opencv',
+                    enforce_detection=False,
+                    detector_backend='skip',
                     silent=True,
                 )
+            if len(analysis) != len(rgb_faces):
+                raise ValueError("batched analysis returned {} results for {} faces".format(
+                    len(analysis), len(rgb_faces)))
+        except Exception as e:
+            print(f"Batched secondary analysis unavailable, analysing faces one by one: {str(e)}")
+            return np.stack([self.detect_with_secondary(face_crop) for face_crop in face_crops])
 
-                for result in analysis:
-                    for e, c in result['emotion'].items():
-                        std_e = self.emotion_mapping.get(e.lower(), e.lower())
-                        combined[std_e] += c
-
-                sorted_items = sorted(combined.items(), key=lambda x: x[1], reverse=True)
-                secondary_emotions = [e for e, _ in sorted_items]
-                secondary_percentages = [p for _, p in sorted_items]
+        outputs = np.zeros((len(face_crops), len(EMOTION_LABELS)))
+        for i, result in enumerate(analysis):
+            if isinstance(result, dict):
+                result = [result]
+            if result:
+                outputs[i] = self.standardize_scores(*[r['emotion'] for r in result])
 
-                total = sum(secondary_percentages)
-                if total > 0:
-                    secondary_percentages = [p / total for p in secondary_percentages]
+        return outputs
 
-                return secondary_emotions, secondary_percentages
+    def run_detectors(self, primary_fn, secondary_fn, face_input, empty, deadline=None):
+        timeout = self.deadline if deadline is None else deadline
 
-            except Exception as e:
-                print(f"Error in secondary model: {str(e)}")
-                return [], []
+        futures = {
+            "primary": get_executor().submit(primary_fn, face_input),
+            "secondary": get_executor().submit(secondary_fn, face_input),
+        }
+        done, _ = wait(futures.values(), timeout=timeout)
+
+        missing = [name for name, future in futures.items() if future not in done]
+        if missing:
+            print(f"detectors missed the {timeout}s deadline: {missing}")
+            self.abandon(futures[name] for name in missing)
+
+        primary = futures["primary"].result() if "primary" not in missing else empty
+        secondary = futures["secondary"].result() if "secondary" not in missing else empty
+
+        return primary, secondary, missing
+
+    @staticmethod
+    def abandon(futures):
+        # jobs still queued behind other requests never start; one already
+        # running cannot be interrupted and finishes in the background
+        for future in futures:
+            future.cancel()
+
+    def needs_secondary(self, primary):
+        """Boolean per row of the (N, 7) primary matrix: the primary detector
+        found nothing, was unsure, or its top two emotions disagree."""
+        empty = primary.sum(axis=-1) == 0
+        unsure = primary.max(axis=-1) < self.primary_threshold
+        return empty | unsure | self.group_conflicts(rank_mask(primary, 2))
+
+    def get_cascade_stats(self):
+        with self._stats_lock:
+            stats = dict(self.cascade_stats)
+        total = stats["secondary_called"] + stats["secondary_skipped"]
+        stats["skip_rate"] = stats["secondary_skipped"] / total if total else 0.0
+        return stats
+
+    def run_cascade(self, primary_fn, secondary_fn, face_inputs, deadline=None):
+        timeout = self.deadline if deadline is None else deadline
+        start = time.time()
+
+        primary_missing = []
+        future = get_executor().submit(primary_fn, face_inputs)
+        done, _ = wait([future], timeout=timeout)
+        if future in done:
+            primary_results = future.result()
+        else:
+            print(f"primary detector missed the {timeout}s deadline")
+            self.abandon([future])
+            primary_results = np.zeros((len(face_inputs), len(EMOTION_LABELS)))
+            primary_missing = ["primary"]
+
+        pending = np.flatnonzero(self.needs_secondary(primary_results)).tolist()
+        with self._stats_lock:
+            self.cascade_stats["secondary_called"] += len(pending)
+            self.cascade_stats["secondary_skipped"] += len(face_inputs) - len(pending)
+
+        secondary_results = np.zeros((len(face_inputs), len(EMOTION_LABELS)))
+        missing = [list(primary_missing) for _ in face_inputs]
+        if pending:
+            remaining = None if timeout is None else max(0.0, timeout - (time.time() - start))
+            future = get_executor().submit(secondary_fn, [face_inputs[i] for i in pending])
+            done, _ = wait([future], timeout=remaining)
+            if future in done:
+                secondary_results[pending] = future.result()
+            else:
+                print(f"secondary detector missed the {timeout}s deadline")
+                self.abandon([future])
+                for i in pending:
+                    missing[i].append("secondary")
+
+        return primary_results, secondary_results, missing
+
+    def detect_emotion_batch(self, face_crops, deadline=None):
+        if not face_crops:
+            return []
+
+        outputs = [None] * len(face_crops)
+        cache_keys = [None] * len(face_crops)
+        if self.cache is not None:
+            for i, face_crop in enumerate(face_crops):
+                cache_keys[i] = self.cache.face_hash(self.prepare_face(face_crop)[0])
+                cached = self.cache.get(cache_keys[i])
+                if cached is not None:
+                    outputs[i] = EmotionResult(*cached, cached=True)
+
+        pending = [i for i, output in enumerate(outputs) if output is None]
+        if not pending:
+            return outputs
+        pending_crops = [face_crops[i] for i in pending]
+
+        if self.cascade:
+            primary_results, secondary_results, missing_per_face = self.run_cascade(
+                self.detect_with_primary_batch, self.detect_with_secondary_batch,
+                pending_crops, deadline
+            )
+        else:
+            primary_results, secondary_results, missing = self.run_detectors(
+                self.detect_with_primary_batch, self.detect_with_secondary_batch,
+                pending_crops, np.zeros((len(pending_crops), len(EMOTION_LABELS))), deadline
+            )
+            missing_per_face = [missing] * len(pending_crops)
 
+        try:
+            scores, kept = self.fuse_scores(primary_results, secondary_results)
+            priorities = self.fusion_priority(primary_results, secondary_results)
         except Exception as e:
-            print(f"Error in secondary model detection: {str(e)}")
-            return [], []
-
-    def detect_emotion(self, image, face):
-        face_roi = image
-        self.retry_count = 0
+            print(f"Error in emotion detection: {str(e)}")
+            for i, missing in zip(pending, missing_per_face):
+                outputs[i] = EmotionResult(["neutral"], [1.0], True, missing, error=str(e))
+            return outputs
+
+        for i, face_scores, face_kept, priority, missing in zip(pending, scores, kept, priorities,
+                                                                missing_per_face):
+            final_emotions, final_percentages = scores_to_lists(face_scores, face_kept, priority)
+            outputs[i] = EmotionResult(final_emotions, final_percentages, bool(missing), missing,
+                                       scores=face_scores)
+            if self.cache is not None and not missing:
+                self.cache.put(cache_keys[i], final_emotions, final_percentages)
+
+        return outputs
+
+    def warm_up(self, image):
+        print("warming up emotion detectors...")
+        h, w = image.shape[:2]
+        try:
+            with self._primary_lock:
+                self.primary_detector.detect_emotions(image, face_rectangles=[(0, 0, w, h)])
+        except Exception as e:
+            print(f"Error in primary model warm up: {str(e)}")
 
-        while self.retry_count < self.max_retries:
+        try:
+            with self._secondary_lock:
+                self.deepface.analyze(
+                    img_path=cv2.cvtColor(image, cv2.COLOR_BGR2RGB),
+                    actions=['emotion'],
+                    enforce_detection=False,
+                    detector_backend='opencv',
+                    silent=True,
+                )
+        except Exception as e:
+            print(f"Error in secondary model warm up: {str(e)}")
+
+    def detect_emotion(self, image, face, deadline=None):
+        frame = FrameContext.of(image)
+        if face is None:
+            face_crop = (frame.bgr, (0, 0, frame.shape[1], frame.shape[0]))
+            face_key = None
+        else:
+            face_crop = FaceUtils.crop_face(frame, face)
+            face_key = FrameContext.face_key(face)
+        face_roi = frame.memo(("face_input", face_key, self.face_size), lambda: self.prepare_face(face_crop))
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.face_hash(face_roi[0])
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("emotion cache hit...")
+                return EmotionResult(*cached, cached=True)
+
+        retries = 0
+        error = None
+        while retries < self.max_retries:
             try:
-                primary_emotions, primary_percentages = self.detect_with_primary(face_roi)
-                secondary_emotions, secondary_percentages = self.detect_with_secondary(face_roi)
-
-                print(f"primary result: {list(zip(primary_emotions, primary_percentages))}")
-                print(f"secondary result: {list(zip(secondary_emotions, secondary_percentages))}")
-
-                final_emotions, final_percentages = self.fuse_results(
-                    primary_emotions, primary_percentages,
-                    secondary_emotions, secondary_percentages
+                if self.cascade:
+                    primary, secondary, missing_per_face = self.run_cascade(
+                        self.detect_with_primary_batch, self.detect_with_secondary_batch,
+                        [face_roi], deadline
+                    )
+                    missing = missing_per_face[0]
+                else:
+                    primary, secondary, missing = self.run_detectors(
+                        self.detect_with_primary_batch, self.detect_with_secondary_batch,
+                        [face_roi], np.zeros((1, len(EMOTION_LABELS))), deadline
+                    )
+
+                print(f"primary result: {dict(zip(EMOTION_LABELS, primary[0].round(3)))}")
+                print(f"secondary result: {dict(zip(EMOTION_LABELS, secondary[0].round(3)))}")
+
+                scores, kept = self.fuse_scores(primary, secondary)
+                final_emotions, final_percentages = scores_to_lists(
+                    scores[0], kept[0], self.fusion_priority(primary, secondary)[0]
                 )
+                print("fused emotions: {}".format(final_emotions))
 
-                self.last_valid_emotions = final_emotions
-                self.last_valid_percentages = final_percentages
+                if self.cache is not None and not missing:
+                    self.cache.put(cache_key, final_emotions, final_percentages)
 
-                return final_emotions, final_percentages
+                return EmotionResult(final_emotions, final_percentages, bool(missing), missing,
+                                     retries=retries, scores=scores[0])
 
             except Exception as e:
                 print(f"Error in emotion detection: {str(e)}")
-                self.retry_count += 1
-                time.sleep(0.1)
+                retries += 1
+                error = str(e)
 
-        return self.last_valid_emotions, self.last_valid_percentages
+        return EmotionResult(["neutral"], [1.0], True, retries=retries, error=error)
@@ -0,0 +1,172 @@
+import sqlite3
+import threading
+import numpy as np
+from core.db_pool import get_pool
+from core.emotion_detector import EMOTION_LABELS, LABEL_INDEX
+from core.feature_store import unpack
+
+
+LOAD_VECTORS = '''
+    SELECT ff.image_id, ff.face_index, ff.scores, i.image_path, fa.gender, fa.age, fa.country
+    FROM face_features ff
+    JOIN images i ON i.id = ff.image_id
+    LEFT JOIN faces fa ON fa.set_id = i.set_id
+    ORDER BY ff.image_id, ff.face_index
+'''
+VERSION = "SELECT COUNT(*), MAX(computed_at) FROM image_features"
+
+
+def emotion_vector(emotions):
+    """A 7-slot vector from a {label: score} dict or a sequence in
+    EMOTION_LABELS order, normalised to sum to 1."""
+    if isinstance(emotions, dict):
+        vector = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+        for label, score in emotions.items():
+            if label.lower() not in LABEL_INDEX:
+                raise ValueError(f"unknown emotion: {label}")
+            vector[LABEL_INDEX[label.lower()]] = score
+    else:
+        vector = np.asarray(emotions, dtype=np.float32).reshape(-1)
+        if vector.shape != (len(EMOTION_LABELS),):
+            raise ValueError(f"expected {len(EMOTION_LABELS)} emotion scores, got {vector.size}")
+
+    if (vector < 0).any() or vector.sum() <= 0:
+        raise ValueError("emotion scores must be non-negative and not all zero")
+    return vector / vector.sum()
+
+
+class EmotionIndex:
+    """Every stored face's fused emotion vector in one (N, 7) matrix, with its
+    image and faces-table metadata in parallel arrays. Queries are a masked
+    matrix-vector product, so the whole library is scanned per query."""
+
+    def __init__(self, db_path="dataset/emotions.sqlite"):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = self._empty()
+
+    @staticmethod
+    def _empty():
+        return {
+            "vectors": np.zeros((0, len(EMOTION_LABELS)), dtype=np.float32),
+            "image_ids": np.zeros(0, dtype=np.int64),
+            "face_indexes": np.zeros(0, dtype=np.int32),
+            "image_paths": np.zeros(0, dtype=object),
+            "gender": np.zeros(0, dtype=np.int32),
+            "gender_names": [],
+            "age": np.zeros(0, dtype=np.float32),
+            "country": np.zeros(0, dtype=np.int32),
+            "country_names": [],
+        }
+
+    @staticmethod
+    def from_rows(rows):
+        if not rows:
+            return EmotionIndex._empty()
+
+        image_ids, face_indexes, scores, image_paths, genders, ages, countries = zip(*rows)
+        vectors = np.stack([unpack(blob, np.float32) for blob in scores])
+        # unit rows: cosine similarity becomes a plain dot product
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        # categorical metadata as integer codes, so filters compare ints
+        gender_names, gender_codes = np.unique([(g or "").upper() for g in genders], return_inverse=True)
+        country_names, country_codes = np.unique([(c or "").upper() for c in countries], return_inverse=True)
+
+        return {
+            "vectors": vectors,
+            "image_ids": np.array(image_ids, dtype=np.int64),
+            "face_indexes": np.array(face_indexes, dtype=np.int32),
+            "image_paths": np.array(image_paths, dtype=object),
+            "gender": gender_codes.astype(np.int32),
+            "gender_names": gender_names.tolist(),
+            "age": np.array([a if a is not None else np.nan for a in ages], dtype=np.float32),
+            "country": country_codes.astype(np.int32),
+            "country_names": country_names.tolist(),
+        }
+
+    def refresh(self, force=False):
+        """Reload the matrix when the feature tables changed since the last
+        load; the check itself is a single aggregate query."""
+        try:
+            version = self.pool.execute(VERSION).fetchone()
+        except sqlite3.OperationalError:
+            # feature tables not created yet: nothing has been precomputed
+            return False
+
+        with self._lock:
+            if not force and version == self._version:
+                return False
+            self._data = self.from_rows(self.pool.execute(LOAD_VECTORS).fetchall())
+            self._version = version
+        print(f"emotion index loaded: {len(self)} faces...")
+        return True
+
+    def __len__(self):
+        return len(self._data["image_ids"])
+
+    def _filter(self, data, gender=None, min_age=None, max_age=None, country=None):
+        """Row indexes passing the filters, or None when nothing is filtered."""
+        mask = None
+        for column, value in (("gender", gender), ("country", country)):
+            if value:
+                names = data[f"{column}_names"]
+                code = names.index(value.upper()) if value.upper() in names else -1
+                hit = data[column] == code
+                mask = hit if mask is None else mask & hit
+        for value, compare in ((min_age, np.greater_equal), (max_age, np.less_equal)):
+            if value is not None:
+                hit = compare(data["age"], value)
+                mask = hit if mask is None else mask & hit
+        return None if mask is None else np.flatnonzero(mask)
+
+    def search(self, emotions, k=10, gender=None, min_age=None, max_age=None, country=None):
+        """k nearest images to the query by cosine distance, best face per image."""
+        query = emotion_vector(emotions)
+        query = query / np.linalg.norm(query)
+
+        data = self._data
+        candidates = self._filter(data, gender, min_age, max_age, country)
+        if candidates is None:
+            candidates = np.arange(len(data["image_ids"]))
+            distances = 1.0 - data["vectors"] @ query
+        else:
+            distances = 1.0 - data["vectors"][candidates] @ query
+        if candidates.size == 0 or k <= 0:
+            return []
+
+        # take enough of the nearest faces to cover k distinct images even if
+        # every face of one image ranks ahead of the next image
+        faces_per_image = int(data["face_indexes"][candidates].max()) + 1
+        n = min(candidates.size, k * faces_per_image)
+        nearest = np.argpartition(distances, n - 1)[:n]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+
+        results = []
+        seen = set()
+        for i in nearest:
+            row = candidates[i]
+            image_id = int(data["image_ids"][row])
+            if image_id in seen:
+                continue
+            seen.add(image_id)
+
+            age = data["age"][row]
+            vector = data["vectors"][row].astype(np.float64)
+            results.append({
+                "image_id": image_id,
+                "image_path": data["image_paths"][row],
+                "face_index": int(data["face_indexes"][row]),
+                "distance": float(distances[i]),
+                "emotions": dict(zip(EMOTION_LABELS, (vector / (vector.sum() or 1.0)).round(4).tolist())),
+                "gender": data["gender_names"][data["gender"][row]] or None,
+                "age": None if np.isnan(age) else int(age),
+                "country": data["country_names"][data["country"][row]] or None,
+            })
+            if len(results) == k:
+                break
+
+        return results
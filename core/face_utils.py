@@ -1,13 +1,16 @@
-import dlib
 import cv2
 import os
 from pathlib import Path
+from core.frame_context import FrameContext
 
 
 class FaceUtils:
-    def __init__(self, predictor_path=None):
+    def __init__(self, predictor_path=None, max_side=640):
+        import dlib
+
         self.detector = dlib.get_frontal_face_detector()
         self.predictor = None
+        self.max_side = max_side
 
         base_dir = Path(__file__).resolve().parent.parent
 
@@ -30,6 +33,22 @@ class FaceUtils:
             traceback.print_exc()
 
     def detect_faces(self, image):
+        image = FrameContext.of(image).bgr
+        h, w = image.shape[:2]
+        longest = max(h, w)
+
+        # run HOG on a downscaled copy first and only go to a finer level
+        # (up to full resolution) when nothing is found
+        side = self.max_side
+        while side and side < longest:
+            scale = side / longest
+            small = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            faces = self.detector(small, 0)
+            if faces:
+                print(f"faces detected at {small.shape[1]}x{small.shape[0]}...")
+                return self._scale_faces(faces, 1 / scale, w, h)
+            side *= 2
+
         faces = self.detector(image, 0)
 
         # '''====================== [green] first face regctangle [green] ======================'''
@@ -41,11 +60,67 @@ class FaceUtils:
 
         return faces
 
+    @staticmethod
+    def rectangle(left, top, right, bottom):
+        import dlib
+
+        return dlib.rectangle(int(left), int(top), int(right), int(bottom))
+
+    @staticmethod
+    def _scale_faces(faces, factor, width, height):
+        import dlib
+
+        scaled = dlib.rectangles()
+        for face in faces:
+            scaled.append(dlib.rectangle(
+                max(0, int(face.left() * factor)),
+                max(0, int(face.top() * factor)),
+                min(width - 1, int(face.right() * factor)),
+                min(height - 1, int(face.bottom() * factor)),
+            ))
+        return scaled
+
+    def detect_faces_batch(self, images):
+        # dlib's HOG detector has no batched entry point, so each frame is
+        # scanned in turn with the same warm detector
+        return [self.detect_faces(image) for image in images]
+
+    @staticmethod
+    def crop_face(image, face, padding=0.25):
+        frame = FrameContext.of(image)
+        return frame.memo(
+            ("face_crop", FrameContext.face_key(face), padding),
+            lambda: FaceUtils._crop(frame.bgr, face, padding)
+        )
+
+    @staticmethod
+    def _crop(image, face, padding):
+        h, w = image.shape[:2]
+        face_w = face.right() - face.left()
+        face_h = face.bottom() - face.top()
+        side = max(face_w, face_h)
+        margin = int(side * padding)
+
+        center_x = face.left() + face_w // 2
+        center_y = face.top() + face_h // 2
+        half = side // 2 + margin
+
+        # faces near an edge are padded out by replicating the border rather
+        # than clipped, so every crop is square and resizing never stretches it
+        x1, y1, x2, y2 = center_x - half, center_y - half, center_x + half, center_y + half
+        crop = image[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+        if x1 < 0 or y1 < 0 or x2 > w or y2 > h:
+            crop = cv2.copyMakeBorder(
+                crop, max(0, -y1), max(0, y2 - h), max(0, -x1), max(0, x2 - w), cv2.BORDER_REPLICATE
+            )
+
+        return crop, (margin, margin, 2 * (side // 2), 2 * (side // 2))
+
     def get_landmarks(self, image, face):
         if self.predictor is None:
             return []
 
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = FrameContext.of(image).gray
 
         try:
             landmarks = self.predictor(gray, face)
@@ -0,0 +1,226 @@
+import os
+import time
+import cv2
+import numpy as np
+from core.db_pool import get_pool
+from core.emotion_detector import EmotionResult, scores_to_lists
+from core.face_utils import FaceUtils
+from core.frame_context import FrameContext
+
+
+SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS image_features (
+        image_id INTEGER PRIMARY KEY REFERENCES images(id),
+        mtime REAL,
+        size INTEGER,
+        face_count INTEGER,
+        computed_at REAL
+    )
+    ''',
+    # box: int32[4] (left, top, right, bottom); landmarks: int32[68, 2];
+    # scores: float32[7] fused emotion scores in EMOTION_LABELS order
+    '''
+    CREATE TABLE IF NOT EXISTS face_features (
+        image_id INTEGER REFERENCES images(id),
+        face_index INTEGER,
+        box BLOB,
+        landmarks BLOB,
+        scores BLOB,
+        PRIMARY KEY (image_id, face_index)
+    )
+    ''',
+    # one row per caption placement (corner=0 side bands, corner=1 corners);
+    # rect/safe_region: int32[4], center: int32[2], mean_color: uint8[3]
+    '''
+    CREATE TABLE IF NOT EXISTS text_regions (
+        image_id INTEGER REFERENCES images(id),
+        face_index INTEGER,
+        corner INTEGER,
+        name TEXT,
+        rect BLOB,
+        center BLOB,
+        safe_region BLOB,
+        complexity REAL,
+        mean_color BLOB,
+        PRIMARY KEY (image_id, face_index, corner)
+    )
+    ''',
+)
+
+LOAD_IMAGE = '''
+    SELECT f.image_id, f.mtime, f.size FROM image_features f
+    JOIN images i ON i.id = f.image_id WHERE i.image_path = ?
+'''
+LOAD_FACES = "SELECT face_index, box, landmarks, scores FROM face_features WHERE image_id = ? ORDER BY face_index"
+LOAD_REGIONS = '''
+    SELECT face_index, corner, name, rect, center, safe_region, complexity, mean_color
+    FROM text_regions WHERE image_id = ?
+'''
+STALE_IMAGES = '''
+    SELECT i.id, i.image_path FROM images i
+    LEFT JOIN image_features f ON f.image_id = i.id
+    WHERE f.image_id IS NULL OR f.mtime IS NOT i.mtime OR f.size IS NOT i.size
+    ORDER BY i.id
+'''
+
+
+def pack(values, dtype):
+    return np.asarray(values, dtype=dtype).tobytes()
+
+
+def unpack(blob, dtype, shape=(-1,)):
+    return np.frombuffer(blob, dtype=dtype).reshape(shape)
+
+
+class FeatureStore:
+    def __init__(self, db_path="dataset/emotions.sqlite"):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        with self.pool.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def load(self, image_path):
+        """Stored features for image_path, or None when there are none or the
+        file's mtime/size no longer match what they were computed from."""
+        conn = self.pool.connection()
+        row = conn.execute(LOAD_IMAGE, (image_path,)).fetchone()
+        if row is None:
+            return None
+
+        image_id, mtime, size = row
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        if (stat.st_mtime, stat.st_size) != (mtime, size):
+            return None
+
+        faces = []
+        for _, box, landmarks, scores in conn.execute(LOAD_FACES, (image_id,)):
+            scores = unpack(scores, np.float32).astype(np.float64)
+            emotions, percentages = scores_to_lists(scores, scores > 0)
+            faces.append({
+                "face": FaceUtils.rectangle(*unpack(box, np.int32)),
+                "landmarks": [tuple(p) for p in unpack(landmarks, np.int32, (-1, 2)).tolist()],
+                "emotion": EmotionResult(emotions, percentages, cached=True, scores=scores),
+                "text_regions": {},
+            })
+
+        for face_index, corner, name, rect, center, safe_region, complexity, mean_color in \
+                conn.execute(LOAD_REGIONS, (image_id,)):
+            faces[face_index]["text_regions"][bool(corner)] = {
+                "name": name,
+                "rect": tuple(unpack(rect, np.int32).tolist()),
+                "center": tuple(unpack(center, np.int32).tolist()),
+                "safe_region": tuple(unpack(safe_region, np.int32).tolist()),
+                "complexity": complexity,
+                "mean_color": tuple(unpack(mean_color, np.uint8).tolist()),
+            }
+
+        return {"image_id": image_id, "faces": faces}
+
+    def analyze(self, pipeline, image):
+        frame = FrameContext.of(image)
+        faces = pipeline.face_utils.detect_faces(frame)
+        landmarks_list = [pipeline.face_utils.get_landmarks(frame, face) for face in faces]
+        face_crops = [pipeline.face_utils.crop_face(frame, face) for face in faces]
+        emotion_results = pipeline.emotion_detector.detect_emotion_batch(face_crops)
+
+        features = []
+        for face, landmarks, emotion_result in zip(faces, landmarks_list, emotion_results):
+            if emotion_result.partial:
+                return None
+            features.append({
+                "box": FrameContext.face_key(face),
+                "landmarks": landmarks,
+                "scores": emotion_result.scores,
+                # corner placements are anchored on landmarks 36-54, so they are
+                # left to render time when the predictor returned none
+                "text_regions": {
+                    corner: pipeline.meme_generator.find_caption_region(frame, face, landmarks, corner)
+                    for corner in (False, True) if not corner or len(landmarks) >= 68
+                },
+            })
+        return features
+
+    def save(self, conn, image_id, stat, features):
+        for table in ("face_features", "text_regions"):
+            conn.execute(f"DELETE FROM {table} WHERE image_id = ?", (image_id,))
+
+        conn.execute(
+            "INSERT OR REPLACE INTO image_features (image_id, mtime, size, face_count, computed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (image_id, stat.st_mtime, stat.st_size, len(features), time.time())
+        )
+        conn.executemany(
+            "INSERT INTO face_features (image_id, face_index, box, landmarks, scores) VALUES (?, ?, ?, ?, ?)",
+            [
+                (image_id, i, pack(f["box"], np.int32), pack(f["landmarks"], np.int32),
+                 pack(f["scores"], np.float32))
+                for i, f in enumerate(features)
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO text_regions (image_id, face_index, corner, name, rect, center, safe_region, "
+            "complexity, mean_color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (image_id, i, int(corner), region["name"], pack(region["rect"], np.int32),
+                 pack(region["center"], np.int32), pack(region["safe_region"], np.int32),
+                 float(region["complexity"]), pack(region["mean_color"], np.uint8))
+                for i, f in enumerate(features)
+                for corner, region in f["text_regions"].items()
+            ]
+        )
+
+    def stale_images(self, limit=None):
+        rows = self.pool.execute(STALE_IMAGES).fetchall()
+        return rows[:limit] if limit else rows
+
+    def precompute(self, pipeline, limit=None, batch_size=32, force=False):
+        """Analyze every indexed image whose features are missing or older than
+        its file, committing once per batch_size images."""
+        if force:
+            rows = self.pool.execute("SELECT id, image_path FROM images ORDER BY id").fetchall()
+            rows = rows[:limit] if limit else rows
+        else:
+            rows = self.stale_images(limit)
+
+        start = time.perf_counter()
+        stats = {"images": len(rows), "stored": 0, "skipped": 0, "faces": 0}
+        for offset in range(0, len(rows), batch_size):
+            analyzed = []
+            for image_id, image_path in rows[offset:offset + batch_size]:
+                try:
+                    image = cv2.imread(image_path)
+                    features = self.analyze(pipeline, image) if image is not None else None
+                    stat = os.stat(image_path) if features is not None else None
+                except Exception as e:
+                    print(f"failed to analyze {image_path}: {e}")
+                    features = None
+                if features is None:
+                    # unreadable, failed, or a detector missed its deadline; retry next run
+                    stats["skipped"] += 1
+                    continue
+                analyzed.append((image_id, stat, features))
+
+            with self.pool.transaction() as conn:
+                for image_id, stat, features in analyzed:
+                    self.save(conn, image_id, stat, features)
+                    stats["stored"] += 1
+                    stats["faces"] += len(features)
+
+            print(f"features stored for {stats['stored']}/{len(rows)} images...")
+
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+
+if __name__ == "__main__":
+    from core.image_database import create_database
+    from core.main import get_pipeline
+
+    create_database()
+    store = FeatureStore("dataset/emotions.sqlite")
+    print(store.precompute(get_pipeline()))
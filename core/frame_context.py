@@ -0,0 +1,47 @@
+import cv2
+from collections import Counter
+from PIL import Image
+
+
+class FrameContext:
+    def __init__(self, image):
+        self.bgr = image
+        self._cache = {}
+        self.allocations = Counter()
+
+    @classmethod
+    def of(cls, image):
+        if isinstance(image, FrameContext):
+            return image
+        return cls(image)
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+    def memo(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+            self.allocations[key[0] if isinstance(key, tuple) else key] += 1
+        return self._cache[key]
+
+    @property
+    def gray(self):
+        return self.memo("gray", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def rgb(self):
+        return self.memo("rgb", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB))
+
+    @property
+    def pil(self):
+        # read-only view for measuring; draw on pil_copy() instead
+        return self.memo("pil", lambda: Image.fromarray(self.rgb))
+
+    def pil_copy(self):
+        self.allocations["pil_copy"] += 1
+        return self.pil.copy()
+
+    @staticmethod
+    def face_key(face):
+        return face.left(), face.top(), face.right(), face.bottom()
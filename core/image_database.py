@@ -1,26 +1,37 @@
-import sqlite3
-import pandas as pd
+import csv
 import os
+import time
+from core.db_pool import get_pool
 
 
-def create_database():
-    image_base_folder = "dataset/images/"
-    csv_file_path = "dataset/emotions.csv"
-    db = "dataset/emotions.sqlite"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
 
-    print("Reading CSV data...")
-    try:
-        df = pd.read_csv(csv_file_path, dtype={'set_id': str})
-        print(f"Successfully read {len(df)} records")
-    except Exception as e:
-        print(f"Failed to read CSV: {e}")
-        return
+UPSERT_FACE = '''
+    INSERT INTO faces (set_id, gender, age, country) VALUES (?, ?, ?, ?)
+    ON CONFLICT(set_id) DO UPDATE SET
+        gender=excluded.gender, age=excluded.age, country=excluded.country
+'''
+
+UPSERT_IMAGE = '''
+    INSERT INTO images (set_id, image_filename, image_path, mtime, size) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(image_path) DO UPDATE SET
+        set_id=excluded.set_id, image_filename=excluded.image_filename,
+        mtime=excluded.mtime, size=excluded.size
+'''
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _has_index(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (name,)
+    ).fetchone() is not None
 
-    print("Creating database...")
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
 
-    cursor.execute('''
+def ensure_schema(conn):
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS faces (
             set_id TEXT PRIMARY KEY,
             gender TEXT,
@@ -29,59 +40,124 @@ def create_database():
         )
     ''')
 
-    cursor.execute('''
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS images (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             set_id TEXT REFERENCES faces(set_id),
             image_filename TEXT,
-            image_path TEXT
+            image_path TEXT,
+            mtime REAL,
+            size INTEGER
         )
     ''')
 
-    print("Inserting data...")
-    df.to_sql('faces', conn, if_exists='replace', index=False)
+    # databases built by the old loader have no stat columns and hold one
+    # duplicate row per file for every run; keep the first (lowest id) row of
+    # each so existing ids stay valid, then let the unique indexes stop it
+    if "mtime" not in _columns(conn, "images"):
+        conn.execute("ALTER TABLE images ADD COLUMN mtime REAL")
+        conn.execute("ALTER TABLE images ADD COLUMN size INTEGER")
 
-    processed = 0
-    errors = 0
+    if not _has_index(conn, "idx_faces_set_id"):
+        conn.execute("DELETE FROM faces WHERE rowid NOT IN (SELECT MAX(rowid) FROM faces GROUP BY set_id)")
+        conn.execute("CREATE UNIQUE INDEX idx_faces_set_id ON faces(set_id)")
+
+    if not _has_index(conn, "idx_images_path"):
+        conn.execute("DELETE FROM images WHERE id NOT IN (SELECT MIN(id) FROM images GROUP BY image_path)")
+        conn.execute("CREATE UNIQUE INDEX idx_images_path ON images(image_path)")
 
-    for sets in df['set_id']:
-        class_folder = os.path.join(image_base_folder, sets)
-        if not os.path.exists(class_folder):
-            print(f"Missing folder for class: {sets}")
-            continue
-        try:
-            file_list = os.listdir(class_folder)
-            for filename in file_list:
-                img_path = os.path.join(class_folder, filename)
 
-                cursor.execute('''
-                        INSERT INTO images (set_id, image_filename, image_path)
-                        VALUES (?, ?, ?)
-                    ''', (sets, filename, img_path))
-                processed += 1
+def read_faces(csv_file_path):
+    with open(csv_file_path, newline="", encoding="utf-8") as f:
+        return [
+            (row["set_id"], row["gender"], int(row["age"]) if row["age"] else None, row["country"])
+            for row in csv.DictReader(f)
+        ]
 
-        except Exception as e:
-            print(f"Error processing {img_path}: {str(e)}")
-            errors += 1
 
-    conn.commit()
+def scan_images(image_base_folder, set_ids):
+    """Yield (set_id, filename, path, mtime, size) for every image under the
+    set folders, using the stat data os.scandir already has."""
+    for set_id in set_ids:
+        class_folder = os.path.join(image_base_folder, set_id)
+        try:
+            entries = list(os.scandir(class_folder))
+        except FileNotFoundError:
+            print(f"Missing folder for class: {set_id}")
+            continue
 
-    print(f"Database created. Processed: {processed}, Errors: {errors}")
+        for entry in entries:
+            if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            stat = entry.stat()
+            yield set_id, entry.name, os.path.join(class_folder, entry.name), stat.st_mtime, stat.st_size
+
+
+def index_dataset(image_base_folder, csv_file_path, db, prune=False):
+    """Bring the faces/images tables in line with the CSV and the image folders.
+
+    Only rows whose CSV values or file mtime/size changed are written, all in
+    one transaction, so rescanning an unchanged dataset is a read-only pass.
+    Rows for files that disappeared are deleted only when prune is set."""
+    start = time.perf_counter()
+    faces = read_faces(csv_file_path)
+    pool = get_pool(db)
+
+    with pool.transaction() as conn:
+        ensure_schema(conn)
+
+        known_faces = {row[0]: row for row in conn.execute("SELECT set_id, gender, age, country FROM faces")}
+        changed_faces = [face for face in faces if known_faces.get(face[0]) != face]
+        conn.executemany(UPSERT_FACE, changed_faces)
+
+        known_images = {
+            path: (mtime, size)
+            for path, mtime, size in conn.execute("SELECT image_path, mtime, size FROM images")
+        }
+        seen = set()
+        changed_images = []
+        for set_id, filename, path, mtime, size in scan_images(image_base_folder, [f[0] for f in faces]):
+            seen.add(path)
+            if known_images.get(path) != (mtime, size):
+                changed_images.append((set_id, filename, path, mtime, size))
+        conn.executemany(UPSERT_IMAGE, changed_images)
+
+        missing = [(path,) for path in known_images if path not in seen]
+        if prune:
+            conn.executemany("DELETE FROM images WHERE image_path=?", missing)
+
+    return {
+        "faces_updated": len(changed_faces),
+        "images_added": sum(1 for row in changed_images if row[2] not in known_images),
+        "images_updated": sum(1 for row in changed_images if row[2] in known_images),
+        "images_missing": len(missing),
+        "images_pruned": len(missing) if prune else 0,
+        "images_total": len(seen),
+        "seconds": time.perf_counter() - start,
+    }
 
-    cursor.execute("SELECT COUNT(*) FROM images")
-    total_records = cursor.fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM images WHERE image_path IS NOT NULL")
-    records_with_images = cursor.fetchone()[0]
+def create_database():
+    image_base_folder = "dataset/images/"
+    csv_file_path = "dataset/emotions.csv"
+    db = "dataset/emotions.sqlite"
 
-    conn.close()
+    print("Indexing dataset...")
+    try:
+        stats = index_dataset(image_base_folder, csv_file_path, db)
+    except Exception as e:
+        print(f"Failed to index dataset: {e}")
+        return
 
     db_size = os.path.getsize(db) / 1024 / 1024
 
     print("=" * 50)
     print(f"Database file: {db}")
     print(f"Statistics:")
-    print(f"   • Total records: {total_records}")
-    print(f"   • Records with images: {records_with_images}")
+    print(f"   • Faces updated: {stats['faces_updated']}")
+    print(f"   • Images added: {stats['images_added']}, updated: {stats['images_updated']}, "
+          f"missing on disk: {stats['images_missing']}")
+    print(f"   • Images on disk: {stats['images_total']}")
+    print(f"   • Scan time: {stats['seconds'] * 1000:.1f} ms")
     print(f"   • Database size: {db_size:.2f} MB")
     print("=" * 50)
@@ -0,0 +1,88 @@
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, workers=2, max_depth=32, max_finished=256):
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.queue = queue.Queue(maxsize=max_depth)
+        self._condition = threading.Condition()
+
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, fn, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+
+        with self._condition:
+            self.jobs[job_id] = job
+            try:
+                self.queue.put_nowait((job_id, fn, args, kwargs))
+            except queue.Full:
+                del self.jobs[job_id]
+                raise JobQueueFull(f"job queue is full ({self.queue.maxsize} jobs waiting)")
+
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, fn, args, kwargs = self.queue.get()
+            self._update(job_id, status="running")
+
+            try:
+                result = fn(*args, **kwargs)
+                self._update(job_id, status="done", result=result, finished_at=time.time())
+            except Exception as e:
+                print(f"Error in job {job_id}: {str(e)}")
+                self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self.queue.task_done()
+
+    def _update(self, job_id, **fields):
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+            self._prune()
+            self._condition.notify_all()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._condition:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id, last_status=None, timeout=None):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id]["status"] != last_status,
+                timeout=timeout
+            )
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def depth(self):
+        return self.queue.qsize()
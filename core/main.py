@@ -1,57 +1,44 @@
-import cv2
-from core.face_utils import FaceUtils
-from core.emotion_detector import EmotionDetector
-from core.meme_generator import MemeGenerator
 from core.image_database import create_database
 from core.DatabaseManager import DatabaseManager
-from core.text_generator import EmotionFusionGenerator
-from core.text_library import get_random_text
+from core.pipeline import MemePipeline
+from core.feature_store import FeatureStore
+from core.meme_generator import DEFAULT_FONT_PATH
 import os
-import random
 
 
-def generate_meme(image_path, font_path=None, output_path=None, predictor_path=None):
-    print(f"start creating meme: {image_path}...")
+_pipelines = {}
 
-    image = cv2.imread(image_path)
-    print("image read...")
 
-    face_utils = FaceUtils(predictor_path)
-    print("face utils ready...")
-    emotion_detector = EmotionDetector()
-    print("emotion detector ready...")
-    meme_generator = MemeGenerator(font_path)
-    print("meme generator ready...")
-    text_generator = EmotionFusionGenerator(predictor_path)
-    print("text generator ready...")
+def get_pipeline(font_path=None, predictor_path=None):
+    key = (font_path, predictor_path)
+    if key not in _pipelines:
+        pipeline = MemePipeline(font_path=font_path, predictor_path=predictor_path)
+        pipeline.warm_up()
+        _pipelines[key] = pipeline
+    return _pipelines[key]
 
-    faces = face_utils.detect_faces(image)
-    print("faces detected...")
 
-    if not faces:
-        print("no human face detected...")
-        return meme_generator.create_error_meme("no human faces"), None
+def generate_meme(image_path, font_path=None, output_path=None, predictor_path=None, pipeline=None):
+    if pipeline is None:
+        pipeline = get_pipeline(font_path, predictor_path)
 
-    face = faces[0]
-    landmarks = face_utils.get_landmarks(image, face)
-    emotion, percentage = emotion_detector.detect_emotion(image, face)
-    text = text_generator.generate_caption(emotion, percentage)
+    return pipeline.generate(image_path, output_path)
 
-    if not text:
-        text = get_random_text(emotion[0])
 
-    meme_img = meme_generator.create_meme(
-        image, face, landmarks, text
-    )
-
-    if output_path is None:
-        os.makedirs("output", exist_ok=True)
-        output_path = os.path.join("output", f"meme_{os.path.basename(image_path)}")
+def generate_memes(paths_or_arrays, font_path=None, output_dir=None, predictor_path=None,
+                   pipeline=None, batch_size=16):
+    if pipeline is None:
+        pipeline = get_pipeline(font_path, predictor_path)
 
-    meme_img.save(output_path)
-    print(f"meme saved to: {output_path}...")
+    # named over the whole list, so batches cannot reuse each other's names
+    output_paths = pipeline.batch_output_paths(paths_or_arrays, output_dir)
+    memes = []
+    for start in range(0, len(paths_or_arrays), batch_size):
+        batch = paths_or_arrays[start:start + batch_size]
+        for result in pipeline.run_batch(batch, output_paths=output_paths[start:start + batch_size]):
+            memes.append((result["meme"], result["output_path"]))
 
-    return meme_img, output_path
+    return memes
 
 
 if __name__ == "__main__":
@@ -59,21 +46,20 @@ if __name__ == "__main__":
     create_database()
     DB_PATH = "dataset/emotions.sqlite"
     db = DatabaseManager(DB_PATH)
-    image_id = random.randint(1, 133)
-    input_image = db.get_image_by_id(image_id)
-    fonts = ["SourceHanSansSC-Heavy.otf", "Bian.otf", "Jianjian.otf"]
-    font_path = "assets/fonts/" + fonts[random.randint(0, len(fonts) - 1)]
+    # whole-dataset runs: python -m core.batch
+    input_image = db.get_random_image()
+    font_path = DEFAULT_FONT_PATH
     predictor_path = "assets/models/shape_predictor_68_face_landmarks.dat"
     api_key = os.getenv('DEEPSEEK_API_KEY')
     if not api_key:
         print("DEEPSEEK_API_KEY Environment Variable not found.")
-    else:
-        efg = EmotionFusionGenerator(api_key)
+
+    pipeline = get_pipeline(font_path, predictor_path)
+    pipeline.feature_store = FeatureStore(DB_PATH)
 
     meme, output_path = generate_meme(
         input_image,
-        font_path=font_path,
-        predictor_path=predictor_path,
+        pipeline=pipeline,
     )
 
     if meme:
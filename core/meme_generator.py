@@ -2,12 +2,145 @@ from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance
 import os
 import cv2
 import numpy as np
-from collections import Counter
-from sklearn.cluster import KMeans
+from functools import lru_cache
 import math
+from core.frame_context import FrameContext
+from core.text_library import TEXT_LIBRARY
+
+
+@lru_cache(maxsize=256)
+def load_font(font_path, size):
+    return ImageFont.truetype(font_path, size)
+
+
+# the one font shipped in the tree, for callers that have no other
+DEFAULT_FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "fonts", "Bian.otf")
+
+OUTLINE_WIDTH = 2
+SHADOW_OFFSET = 2
+OUTLINE_KERNEL = np.ones((2 * OUTLINE_WIDTH + 1, 2 * OUTLINE_WIDTH + 1), np.uint8)
+CAPTION_CACHE_SIZE = 1024
+
+
+def render_text_mask(text, font, vertical=False, anchor='lt'):
+    """Rasterize the caption once into an 'L' mask, padded by OUTLINE_WIDTH so
+    the dilated outline fits. Returns the mask and the pixel offset of the
+    text origin inside it."""
+    chars = list(text) if vertical else [text]
+    step = font.size if vertical else 0
+    boxes = [font.getbbox(chunk, anchor=anchor) for chunk in chars]
+
+    left = min(0, min(box[0] for box in boxes))
+    top = min(0, min(box[1] for box in boxes))
+    right = max(box[2] for box in boxes)
+    bottom = max(box[3] + i * step for i, box in enumerate(boxes))
+
+    origin = (OUTLINE_WIDTH - left, OUTLINE_WIDTH - top)
+    mask = Image.new("L", (right - left + 2 * OUTLINE_WIDTH, bottom - top + 2 * OUTLINE_WIDTH), 0)
+    draw = ImageDraw.Draw(mask)
+    for i, chunk in enumerate(chars):
+        draw.text((origin[0], origin[1] + i * step), chunk, font=font, fill=255, anchor=anchor)
+
+    return mask, origin
+
+
+def outline_mask(mask):
+    return Image.fromarray(cv2.dilate(np.asarray(mask), OUTLINE_KERNEL))
+
+
+def composite_text(pil_img, position, mask, origin, fill, outline_color=None, shadow_color=None,
+                   outline=None):
+    """Paste shadow, outline and fill through one glyph mask. The outline is a
+    single dilation of that mask instead of eight offset draw calls."""
+    x = int(position[0]) - origin[0]
+    y = int(position[1]) - origin[1]
+
+    if shadow_color:
+        pil_img.paste(shadow_color[:3], (x + SHADOW_OFFSET, y + SHADOW_OFFSET), mask)
+    if outline_color:
+        pil_img.paste(outline_color, (x, y), outline if outline is not None else outline_mask(mask))
+    pil_img.paste(fill, (x, y), mask)
+
+
+class RenderedCaption:
+    def __init__(self, mask, origin, outline=None):
+        self.mask = mask
+        self.origin = origin
+        self.outline = outline
+        # extent of the glyphs themselves, without the outline padding
+        self.size = (mask.width - 2 * OUTLINE_WIDTH, mask.height - 2 * OUTLINE_WIDTH)
+
+    def paste(self, pil_img, position, fill, outline_color=None, shadow_color=None):
+        composite_text(pil_img, position, self.mask, self.origin, fill,
+                       outline_color, shadow_color, self.outline)
+
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def render_caption(text, font_path, size, vertical=False, effect=None):
+    """Rendered masks are read-only after creation, so one entry can be pasted
+    by any number of requests. effect="outline" also keeps the dilated mask."""
+    mask, origin = render_text_mask(text, load_font(font_path, size), vertical)
+    return RenderedCaption(mask, origin, outline_mask(mask) if effect == "outline" else None)
+
+
+def dominant_colors(pixels, k=1, bits=4):
+    pixels = pixels.reshape((-1, 3))
+    if len(pixels) == 0:
+        return [(128, 128, 128)]
+    if k == 1:
+        # one k-means cluster is the plain mean, as the old KMeans call gave
+        return [tuple(int(c) for c in pixels.mean(axis=0))]
+
+    # k > 1: the k most populated cells of a 2**bits-per-channel histogram
+    shift = 8 - bits
+    quantized = (pixels >> shift).astype(np.int32)
+    codes = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+
+    n_bins = 1 << (3 * bits)
+    counts = np.bincount(codes, minlength=n_bins)
+    top = np.argsort(counts)[::-1][:k]
+    top = top[counts[top] > 0]
+
+    colors = np.stack([
+        np.bincount(codes, weights=pixels[:, c], minlength=n_bins)[top] for c in range(3)
+    ], axis=1) / counts[top, None]
+
+    return [tuple(int(c) for c in color) for color in colors]
+
+
+class RegionStats:
+    def __init__(self, image_array):
+        # summed-area tables of pixel values and their squares, so the mean
+        # and standard deviation of any rectangle cost four lookups each
+        self.height, self.width = image_array.shape[:2]
+        self.sum, self.sq_sum = cv2.integral2(image_array, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+
+    @staticmethod
+    def _box(table, x1, y1, x2, y2):
+        return table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1]
+
+    def mean_std(self, rect):
+        x1, y1, x2, y2 = rect
+        x1, x2 = max(0, min(self.width, int(x1))), max(0, min(self.width, int(x2)))
+        y1, y2 = max(0, min(self.height, int(y1))), max(0, min(self.height, int(y2)))
+
+        n = (x2 - x1) * (y2 - y1)
+        if x2 <= x1 or y2 <= y1:
+            return None, None
+
+        mean = self._box(self.sum, x1, y1, x2, y2) / n
+        variance = self._box(self.sq_sum, x1, y1, x2, y2) / n - mean ** 2
+        return mean, np.sqrt(np.maximum(variance, 0))
 
 
 class MemeGenerator:
+    REGION_SHIFTS = np.linspace(0.0, 1.0, 9)
+    REGION_INSETS = (0.0, 0.15, 0.3)
+    REGION_TRIMS = (0.0, 0.1, 0.2)
+    # exponent on a candidate's area relative to the old fixed placement
+    REGION_SIZE_WEIGHT = 2
+    FONT_SIZE_STEP = 4
+
     def __init__(self, font_path):
         self.font_path = font_path
         self.base_font_size = None
@@ -19,8 +152,8 @@ class MemeGenerator:
         print("loading fonts...")
         try:
             if self.font_path and os.path.exists(self.font_path):
-                self.font = ImageFont.truetype(self.font_path, placeholder_size)
-                self.small_font = ImageFont.truetype(self.font_path, int(placeholder_size * 0.7))
+                self.font = load_font(self.font_path, placeholder_size)
+                self.small_font = load_font(self.font_path, int(placeholder_size * 0.7))
             else:
                 raise FileNotFoundError("error in meme_generator-load_fonts")
         except Exception as e:
@@ -44,7 +177,18 @@ class MemeGenerator:
     #     return tuple(dominant_color.astype(int))
 
     def _get_dominant_color(self, image_array, k=1):
+        return self._get_palette(image_array, k)[0]
+
+    def _get_palette(self, image_array, k=1):
         print("getting dominant color from corners...")
+        all_pixels = self._get_corner_pixels(image_array)
+
+        if len(all_pixels) > 0:
+            return dominant_colors(all_pixels, k)
+        else:
+            return [(128, 128, 128)]
+
+    def _get_corner_pixels(self, image_array):
         h, w, _ = image_array.shape
 
         corner_size = int(min(h, w) * 0.3)
@@ -61,23 +205,17 @@ class MemeGenerator:
         for corner in corners:
             x1, y1, x2, y2 = corner
             corner_img = image_array[y1:y2, x1:x2]
+            if corner_img.size == 0:
+                continue
 
             scale = min(1.0, 200.0 / max(corner_img.shape[0], corner_img.shape[1]))
             small_img = cv2.resize(corner_img, (0, 0), fx=scale, fy=scale)
             pixels = small_img.reshape((-1, 3))
             all_pixels.append(pixels)
 
-        all_pixels = np.vstack(all_pixels)
-
-        if len(all_pixels) > 0:
-            kmeans = KMeans(n_clusters=k, n_init=10)
-            kmeans.fit(all_pixels)
-
-            counts = Counter(kmeans.labels_)
-            dominant_color = kmeans.cluster_centers_[counts.most_common(1)[0][0]]
-            return tuple(dominant_color.astype(int))
-        else:
-            return (128, 128, 128)
+        if not all_pixels:
+            return np.empty((0, 3), dtype=image_array.dtype)
+        return np.vstack(all_pixels)
 
     def _get_contrast_color(self, bg_color):
         print("getting contrast color...")
@@ -93,17 +231,7 @@ class MemeGenerator:
         complexity = np.mean(std_dev)
         return complexity
 
-    def _find_text_region(self, image_array, face, face_rect, landmarks, corner=False):
-        print("finding text region...")
-        print("=" * 50)
-        print("face region: ", face.left(), face.top(), face.right(), face.bottom())
-        print("image region: ", face_rect["left"], face_rect["top"], face_rect["right"], face_rect["bottom"])
-        print("=" * 50)
-
-        pil_img = Image.fromarray(image_array)
-
-        img_width, img_height = pil_img.size
-
+    def _candidate_regions(self, face, face_rect, landmarks, corner, img_width, img_height):
         safe_left = face_rect["left"]
         safe_top = face_rect["top"]
         safe_right = face_rect["right"]
@@ -126,129 +254,198 @@ class MemeGenerator:
                 {"name": "right_top", "rect": (landmarks[36][0], safe_top, safe_right, landmarks[36][1])},
             ]
 
-        face_x = (face.left() + face.right()) // 2
-        face_y = (face.top() + face.bottom()) // 2
+        def place(name, rect, shift, inset, trim):
+            x1, y1, x2, y2 = rect
+            x3, y3, x4, y4 = safe_left, safe_top, safe_right, safe_bottom
 
-        best_region = None
-        best_score = -1
+            if name == "top":
+                y1 = y3 = max(0, y1 - int((safe_bottom - face.bottom()) * shift))
+                y4 = y3 + (safe_bottom - safe_top)
+                y2 -= int((y2 - y1) * inset)
+            elif name == "bottom":
+                y2 = y4 = min(img_height, y2 + int((face.top() - safe_top) * shift))
+                y3 = y4 - (safe_bottom - safe_top)
+                y1 += int((y2 - y1) * inset)
+            elif name == "left":
+                x1 = x3 = max(0, x1 - int((safe_right - face.right()) * shift))
+                x4 = x3 + (safe_right - safe_left)
+                x2 -= int((x2 - x1) * inset)
+            else:
+                x2 = x4 = min(img_width, x2 + int((face.left() - safe_left) * shift))
+                x3 = x4 - (safe_right - safe_left)
+                x1 += int((x2 - x1) * inset)
+
+            if name in ["top", "bottom"]:
+                margin = int((x2 - x1) * trim)
+                x1, x2 = x1 + margin, x2 - margin
+            else:
+                margin = int((y2 - y1) * trim)
+                y1, y2 = y1 + margin, y2 - margin
+
+            return (x1, y1, x2, y2), (x3, y3, x4, y4)
 
-        print("=" * 50)
         for region in regions:
-            x1, y1, x2, y2 = region["rect"]
-            x3, y3, x4, y4 = safe_left, safe_top, safe_right, safe_bottom
+            name = region["name"]
+            # the old fixed placement; candidates are sized relative to it
+            (x1, y1, x2, y2), _ = place(name, region["rect"], 0.5, 0.0, 0.0)
+            base_area = max(0, x2 - x1) * max(0, y2 - y1)
+
+            # shift: how far the crop square slides away from the face (0.5 of
+            # the opposite margin is the old fixed placement); inset: how much
+            # of the band next to the face is dropped; trim: lateral shrink
+            for shift in self.REGION_SHIFTS:
+                for inset in self.REGION_INSETS:
+                    for trim in self.REGION_TRIMS:
+                        rect, safe_region = place(name, region["rect"], shift, inset, trim)
+                        yield name, rect, safe_region, base_area
+
+    def _find_text_region(self, image_array, face, face_rect, landmarks, corner=False, stats=None):
+        print("finding text region...")
+        print("=" * 50)
+        print("face region: ", face.left(), face.top(), face.right(), face.bottom())
+        print("image region: ", face_rect["left"], face_rect["top"], face_rect["right"], face_rect["bottom"])
+        print("=" * 50)
 
-            if region["name"] == "top":
-                y1 = y3 = max(0, y1-(safe_bottom-face.bottom())//2)
-                y4 = y3 + (safe_bottom-safe_top)
-                region_img = image_array[y1:y2, x1:x2]
-            elif region["name"] == "bottom":
-                y2 = y4 = min(img_height, y2+(face.top()-safe_top)//2)
-                y3 = y4 - (safe_bottom-safe_top)
-                region_img = image_array[y1:y2, x1:x2]
-            elif region["name"] == "left":
-                x1 = x3 = max(0, x1-(safe_right-face.right())//2)
-                x4 = x3 + (safe_right-safe_left)
-                region_img = image_array[y1:y2, x1:x2]
-            else:
-                x2 = x4 = min(img_width, x2+(face.left()-safe_left)//2)
-                x3 = x4 - (safe_right-safe_left)
-                region_img = image_array[y1:y2, x1:x2]
+        img_height, img_width = image_array.shape[:2]
+        if stats is None:
+            stats = RegionStats(image_array)
 
-            complexity = self._get_complexity_score(region_img)
-            print(region["name"], complexity)
+        safe_left = face_rect["left"]
+        safe_top = face_rect["top"]
+        safe_right = face_rect["right"]
+        safe_bottom = face_rect["bottom"]
 
-            region_center_x = (x1 + x2) // 2
-            region_center_y = (y1 + y2) // 2
-            distance = math.sqrt((face_x - region_center_x) ** 2 + (face_y - region_center_y) ** 2)
+        face_x = (face.left() + face.right()) // 2
+        face_y = (face.top() + face.bottom()) // 2
 
-            score = 1.0 / (complexity + 1)
+        best_region = None
+        best_score = -1
+        n_candidates = 0
+
+        print("=" * 50)
+        for name, rect, safe_region, base_area in self._candidate_regions(
+                face, face_rect, landmarks, corner, img_width, img_height):
+            mean, std = stats.mean_std(rect)
+            if mean is None:
+                continue
+            n_candidates += 1
+
+            complexity = float(np.mean(std))
+            # smaller boxes are almost always flatter, so without a size term
+            # the most inset and trimmed variant wins and captions shrink; a
+            # box is penalized for the area it gives up against the old
+            # placement, and growing past it earns nothing
+            x1, y1, x2, y2 = rect
+            size = min(1.0, (x2 - x1) * (y2 - y1) / base_area) if base_area > 0 else 1.0
+            score = size ** self.REGION_SIZE_WEIGHT / (complexity + 1)
 
             if score > best_score:
+                region_center_x = (x1 + x2) // 2
+                region_center_y = (y1 + y2) // 2
+                distance = math.sqrt((face_x - region_center_x) ** 2 + (face_y - region_center_y) ** 2)
+
                 best_score = score
                 best_region = {
-                    "name": region["name"],
-                    "rect": (x1, y1, x2, y2),
+                    "name": name,
+                    "rect": rect,
                     "center": (region_center_x, region_center_y),
                     "complexity": complexity,
                     "distance": distance,
-                    "image": region_img,
-                    "safe_region": (x3, y3, x4, y4)
+                    "image": image_array[y1:y2, x1:x2],
+                    "mean_color": tuple(int(c) for c in mean),
+                    "safe_region": safe_region
                 }
+        print("candidate regions scored: ", n_candidates)
 
         if best_region is None:
             print("using default region...")
+            split = int((safe_top + safe_bottom) * 0.7)
+            mean, std = stats.mean_std((safe_left, safe_top, safe_right, split))
             bottom_region = {
                 "name": "bottom",
-                "rect": (safe_left, int((safe_top + safe_bottom) * 0.7), safe_right, safe_bottom),
+                "rect": (safe_left, split, safe_right, safe_bottom),
                 "center": ((safe_left + safe_right) // 2, int((safe_top + safe_bottom) * 0.85)),
-                "complexity": self._get_complexity_score(
-                    image_array[safe_top:int((safe_top + safe_bottom) * 0.7), safe_left:safe_right]
-                ),
-                "image": image_array[safe_top:int((safe_top + safe_bottom) * 0.7), safe_left:safe_right],
+                "complexity": float(np.mean(std)) if std is not None else 0,
+                "image": image_array[safe_top:split, safe_left:safe_right],
+                "mean_color": tuple(int(c) for c in mean) if mean is not None else (128, 128, 128),
                 "safe_region": (safe_left, safe_top, safe_right, safe_bottom)
             }
             print("=" * 50)
             return bottom_region
 
-        print("best region: ", best_region["name"])
+        print("best region: ", best_region["name"], best_region["rect"], best_region["complexity"])
         print("=" * 50)
 
         return best_region
 
-    def _draw_vertical_text(self, draw, text, position, font, fill, outline_color, spacing=10):
-        x, y = position
-        for char in text:
-            if outline_color:
-                offsets = [(dx, dy) for dx in (-2, 0, 2) for dy in (-2, 0, 2) if dx != 0 or dy != 0]
-                for dx, dy in offsets:
-                    draw.text((x + dx, y + dy), char, font=font, fill=outline_color, anchor='lt')
-
-            draw.text((x, y), char, font=font, fill=fill, anchor='lt')
-            y += font.size
-
-    def _draw_horizontal_text(self, draw, text, position, font, fill, outline_color):
-        x, y = position
-        if outline_color:
-            offsets = [(dx, dy) for dx in (-2, 0, 2) for dy in (-2, 0, 2) if dx != 0 or dy != 0]
-            for dx, dy in offsets:
-                draw.text((x + dx, y + dy), text, font=font, fill=outline_color, anchor='lt')
-
-        draw.text((x, y), text, font=font, fill=fill, anchor='lt')
-
-    def _draw_text(self, draw, text, region, position, font, text_color, outline_color):
+    def _draw_text(self, pil_img, text, region, position, font, text_color,
+                   outline_color=None, shadow_color=None):
         x1, y1, x2, y2 = region["rect"]
-
-        if x2-x1 < y2-y1:
-            self._draw_vertical_text(
-                draw, text,
-                position=position,
-                font=font,
-                fill=text_color,
-                outline_color=outline_color
-            )
+        vertical = x2-x1 < y2-y1
+        if self.font_path and os.path.exists(self.font_path):
+            effect = "outline" if outline_color else None
+            rendered = render_caption(text, self.font_path, font.size, vertical, effect)
         else:
-            self._draw_horizontal_text(
-                draw, text,
-                position=position,
-                font=font,
-                fill=text_color,
-                outline_color=outline_color
-            )
-
-    def _draw_text_with_outline(self, draw, region, position, text, font, text_color, outline_color):
+            rendered = RenderedCaption(*render_text_mask(text, font, vertical))
+        rendered.paste(pil_img, position, text_color, outline_color, shadow_color)
+
+    def _draw_text_with_outline(self, pil_img, region, position, text, font, text_color, outline_color):
         print("drawing text with outline...")
-        self._draw_text(draw, text, region, position, font=font, text_color=None, outline_color=outline_color)
-        self._draw_text(draw, text, region, position, font=font, text_color=text_color, outline_color=None)
+        self._draw_text(pil_img, text, region, position, font, text_color, outline_color=outline_color)
 
-    def _draw_text_with_shadow(self, draw, region, position, text, font, text_color, shadow_color):
+    def _draw_text_with_shadow(self, pil_img, region, position, text, font, text_color, shadow_color):
         print("drawing text with shadow...")
-        x, y = position
-        self._draw_text(draw, text, region, (x + 2, y + 2), font=font, text_color=shadow_color, outline_color=None)
-        self._draw_text(draw, text, region, position, font=font, text_color=text_color, outline_color=None)
+        self._draw_text(pil_img, text, region, position, font, text_color, shadow_color=shadow_color)
+
+    def _font_overflows(self, draw, text, vertical, font_size, region_width, region_height):
+        font = load_font(self.font_path, font_size)
+        if vertical:
+            max_char_width = max([draw.textlength(char, font=font) for char in text])
+            total_height = len(text) * font_size + (len(text) - 1) * 10
+            return max_char_width > region_width * 0.9 or total_height > region_height * 0.9
+
+        text_width = draw.textlength(text, font=font)
+        return text_width >= region_width * 0.9 or font_size >= region_height * 0.9
+
+    def _fit_font_size(self, draw, text, vertical, region_width, region_height, min_size=10):
+        # smallest size that no longer fits the region, found by bisection
+        # instead of growing the font one point at a time
+        low = min_size
+        high = max(min_size, int(region_height * 0.9) + 1)
+
+        while low < high:
+            mid = (low + high) // 2
+            if self._font_overflows(draw, text, vertical, mid, region_width, region_height):
+                high = mid
+            else:
+                low = mid + 1
+
+        # snap to the size grid so repeat captions hit the render cache
+        return max(min_size, low - low % self.FONT_SIZE_STEP)
+
+    def prerender_library(self, sizes=(32, 48, 64), effects=(None, "outline")):
+        if not (self.font_path and os.path.exists(self.font_path)):
+            return 0
+
+        print("pre-rendering text library captions...")
+        count = 0
+        for texts in TEXT_LIBRARY.values():
+            for text in set(texts):
+                for size in sizes:
+                    for vertical in (False, True):
+                        for effect in effects:
+                            render_caption(text, self.font_path, size, vertical, effect)
+                            count += 1
+        return count
+
+    @staticmethod
+    def get_render_cache_stats():
+        info = render_caption.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
 
     def create_error_meme(self, image, text="no human face detected..."):
         print("creating error meme...")
-        pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        pil_img = FrameContext.of(image).pil
         width, height = pil_img.size
 
         square_size = min(width, height)
@@ -270,7 +467,7 @@ class MemeGenerator:
 
         try:
             if self.font_path and os.path.exists(self.font_path):
-                font = ImageFont.truetype(self.font_path, font_size)
+                font = load_font(self.font_path, font_size)
             else:
                 font = ImageFont.load_default()
         except:
@@ -281,21 +478,22 @@ class MemeGenerator:
         text_y = square_size * 0.85
 
         outline_color = (255, 255, 255) if text_color == (0, 0, 0) else (0, 0, 0)
-        offsets = [(dx, dy) for dx in (-2, 0, 2) for dy in (-2, 0, 2) if dx != 0 or dy != 0]
-        for dx, dy in offsets:
-            draw.text((text_x + dx, text_y + dy), text, font=font, fill=outline_color)
-
-        draw.text((text_x, text_y), text, font=font, fill=text_color)
+        mask, origin = render_text_mask(text, font, anchor='la')
+        composite_text(cropped_img, (text_x, text_y), mask, origin, text_color, outline_color)
 
         return cropped_img
 
-    def create_meme(self, image, face, landmarks, text):
-        print("creating meme...")
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(image_rgb)
-        draw = ImageDraw.Draw(pil_img)
+    @staticmethod
+    def uses_corner(text):
+        # very short captions go in a corner instead of a side band
+        return len(text) <= 2
 
-        img_width, img_height = pil_img.size
+    def find_caption_region(self, image, face, landmarks, corner=False):
+        frame = FrameContext.of(image)
+        image_rgb = frame.rgb
+        stats = frame.memo("region_stats", lambda: RegionStats(image_rgb))
+
+        img_height, img_width = frame.shape[:2]
 
         max_size = min(img_width, img_height)
 
@@ -320,16 +518,9 @@ class MemeGenerator:
             'bottom': end_y
         }
 
-        if len(text) <= 2:
-            text_region = self._find_text_region(image_rgb, face, face_rect, landmarks, True)
-        else:
-            text_region = self._find_text_region(image_rgb, face, face_rect, landmarks, False)
+        text_region = self._find_text_region(image_rgb, face, face_rect, landmarks, corner, stats)
 
-        if text_region:
-            region_x1, region_y1, region_x2, region_y2 = text_region["rect"]
-            region_center_x, region_center_y = text_region["center"]
-            print("text_region: ", region_x1, region_y1, region_x2, region_y2)
-        else:
+        if not text_region:
             print("no text region")
             safe_left = max(0, face.left() - space // 2)
             safe_top = max(0, face.top() - space // 2)
@@ -341,13 +532,27 @@ class MemeGenerator:
                 "rect": (safe_left, int((safe_top + safe_bottom) * 0.7), safe_right, safe_bottom),
                 "center": ((safe_left + safe_right) // 2, int((safe_top + safe_bottom) * 0.85)),
                 "complexity": 0,
-                "image": image_rgb[safe_top:safe_bottom, safe_left:safe_right]
+                "image": image_rgb[safe_top:safe_bottom, safe_left:safe_right],
+                "safe_region": (safe_left, safe_top, safe_right, safe_bottom)
             }
+
+        if text_region.get("mean_color") is None:
             region_x1, region_y1, region_x2, region_y2 = text_region["rect"]
-            region_center_x, region_center_y = text_region["center"]
+            region_img = image_rgb[region_y1:region_y2, region_x1:region_x2]
+            text_region["mean_color"] = self._get_dominant_color(region_img)
+
+        return text_region
 
-        region_img = image_rgb[region_y1:region_y2, region_x1:region_x2]
-        region_dominant_color = self._get_dominant_color(region_img)
+    def _draw_caption(self, frame, pil_img, draw, face, landmarks, text, text_region=None):
+        # text_region may come precomputed (see FeatureStore)
+        if text_region is None:
+            text_region = self.find_caption_region(frame, face, landmarks, corner=self.uses_corner(text))
+
+        region_x1, region_y1, region_x2, region_y2 = text_region["rect"]
+        region_center_x, region_center_y = text_region["center"]
+        print("text_region: ", region_x1, region_y1, region_x2, region_y2)
+
+        region_dominant_color = text_region["mean_color"]
         text_color = self._get_contrast_color(region_dominant_color)
 
         print("=" * 50)
@@ -355,26 +560,13 @@ class MemeGenerator:
         print("text_color: ", text_color)
         print("=" * 50)
 
-        font_size = 10
-        font = ImageFont.truetype(self.font_path, font_size)
-
         region_width = region_x2 - region_x1
         region_height = region_y2 - region_y1
 
-        while True:
-            if text_region["name"] in ['left', 'right']:
-                max_char_width = max([draw.textlength(char, font=font) for char in text])
-                total_height = len(text) * font_size + (len(text) - 1) * 10
-
-                if max_char_width > region_width * 0.9 or total_height > region_height * 0.9:
-                    break
-            else:
-                text_width = draw.textlength(text, font=font)
-                if text_width >= region_width * 0.9 or font_size >= region_height * 0.9:
-                    break
-
-            font_size += 1
-            font = ImageFont.truetype(self.font_path, font_size)
+        font_size = self._fit_font_size(
+            draw, text, text_region["name"] in ['left', 'right'], region_width, region_height
+        )
+        font = load_font(self.font_path, font_size)
 
         if text_region["name"] in ['left', 'right']:
             max_char_width = max([draw.textlength(char, font=font) for char in text])
@@ -395,13 +587,35 @@ class MemeGenerator:
 
         complexity = text_region["complexity"]
         if complexity > 80:
-            self._draw_text_with_outline(draw, text_region, (x, y), text, font, text_color, outline_color)
+            self._draw_text_with_outline(pil_img, text_region, (x, y), text, font, text_color, outline_color)
         elif complexity > 60:
-            self._draw_text_with_shadow(draw, text_region, (x, y), text, font, text_color, shadow_color)
+            self._draw_text_with_shadow(pil_img, text_region, (x, y), text, font, text_color, shadow_color)
         else:
-            self._draw_text(draw, text, text_region, (x, y), font=font, text_color=text_color, outline_color=None)
+            self._draw_text(pil_img, text, text_region, (x, y), font, text_color)
+
+        return text_region["safe_region"]
+
+    def create_composite_meme(self, image, faces, landmarks_list, texts, text_regions=None):
+        print(f"creating composite meme for {len(faces)} faces...")
+        frame = FrameContext.of(image)
+        pil_img = frame.pil_copy()
+        draw = ImageDraw.Draw(pil_img)
+
+        text_regions = text_regions or [None] * len(faces)
+        for face, landmarks, text, text_region in zip(faces, landmarks_list, texts, text_regions):
+            self._draw_caption(frame, pil_img, draw, face, landmarks, text, text_region)
+
+        return pil_img
+
+    def create_meme(self, image, face, landmarks, text, text_region=None):
+        print("creating meme...")
+        frame = FrameContext.of(image)
+        pil_img = frame.pil_copy()
+        draw = ImageDraw.Draw(pil_img)
 
-        start_x, start_y, end_x, end_y = text_region["safe_region"]
+        start_x, start_y, end_x, end_y = self._draw_caption(
+            frame, pil_img, draw, face, landmarks, text, text_region
+        )
 
         # '''====================== [red] third face regctangle [red] ======================'''
         # draw.rectangle(
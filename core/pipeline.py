@@ -0,0 +1,393 @@
+import os
+import time
+import threading
+import cv2
+import numpy as np
+from collections import Counter
+from contextlib import contextmanager
+from io import BytesIO
+from core.face_utils import FaceUtils
+from core.emotion_detector import EmotionDetector
+from core.meme_generator import MemeGenerator
+from core.text_generator import EmotionFusionGenerator
+from core.caption_pool import CaptionPool
+from core.frame_context import FrameContext
+from core.text_library import get_random_text
+
+
+class MemePipeline:
+    def __init__(self, font_path=None, predictor_path=None, llm_model="deepseek-chat",
+                 detector_options=None, caption_pool=True, face_detection_max_side=640,
+                 prerender_captions=False, preload=True, feature_store=None):
+        self.font_path = font_path
+        self.predictor_path = predictor_path
+        self.llm_model = llm_model
+        self.detector_options = detector_options or {}
+        self.use_caption_pool = caption_pool
+        self.face_detection_max_side = face_detection_max_side
+        self.prerender_captions = prerender_captions
+        self.feature_store = feature_store
+
+        self.face_utils = None
+        self.emotion_detector = None
+        self.meme_generator = None
+        self.text_generator = None
+        self.caption_pool = None
+        self.models = {
+            "face_utils": False,
+            "emotion_detector": False,
+            "meme_generator": False,
+            "text_generator": False,
+        }
+        self.load_error = None
+        self.loaded = False
+        self.warmed_up = False
+
+        self.stage_times = Counter()
+        self.stage_counts = Counter()
+        self._stage_lock = threading.Lock()
+
+        if preload:
+            self.load()
+
+    def load(self):
+        # dlib, TensorFlow (fer/deepface) and the OpenAI client are imported by
+        # these constructors, not when core.pipeline is imported
+        print("loading meme pipeline...")
+        try:
+            self.face_utils = FaceUtils(self.predictor_path, max_side=self.face_detection_max_side)
+            self.models["face_utils"] = True
+            print("face utils ready...")
+            self.emotion_detector = EmotionDetector(**self.detector_options)
+            self.models["emotion_detector"] = True
+            print("emotion detector ready...")
+            self.meme_generator = MemeGenerator(self.font_path)
+            self.models["meme_generator"] = True
+            print("meme generator ready...")
+            self.text_generator = EmotionFusionGenerator(self.llm_model)
+            self.models["text_generator"] = True
+            print("text generator ready...")
+            self.caption_pool = CaptionPool(self.text_generator) if self.use_caption_pool else None
+        except Exception as e:
+            self.load_error = str(e)
+            raise
+
+        self.loaded = True
+        return self
+
+    def get_status(self):
+        return {
+            "ready": self.loaded and self.warmed_up,
+            "loaded": self.loaded,
+            "warmed_up": self.warmed_up,
+            "models": dict(self.models),
+            "error": self.load_error,
+        }
+
+    def warm_up(self, size=128):
+        print("warming up meme pipeline...")
+        dummy = np.full((size, size, 3), 127, dtype=np.uint8)
+        cv2.circle(dummy, (size // 2, size // 2), size // 3, (200, 200, 200), -1)
+
+        try:
+            self.face_utils.detect_faces(dummy)
+            self.emotion_detector.warm_up(dummy)
+            self.meme_generator.create_error_meme(dummy, "warm up")
+            # a full caption render, so a font that cannot be opened fails here
+            # and not on the first real request
+            face = FaceUtils.rectangle(size // 3, size // 3, 2 * size // 3, 2 * size // 3)
+            self.meme_generator.create_meme(dummy, face, [(size // 2, size // 2)] * 68, "warm up")
+            if self.prerender_captions:
+                self.meme_generator.prerender_library()
+            if self.caption_pool is not None:
+                self.caption_pool.prefill(
+                    [([e], [1.0]) for e in self.text_generator.emotion_labels]
+                )
+        except Exception as e:
+            # surfaced through get_status, so clients stop waiting for readiness
+            self.load_error = f"warm-up failed: {e}"
+            raise
+
+        self.warmed_up = True
+        print("meme pipeline warmed up...")
+
+    @contextmanager
+    def stage(self, name, count=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stage_lock:
+                self.stage_times[name] += elapsed
+                self.stage_counts[name] += count
+
+    def pop_stage_times(self):
+        """{stage: (seconds, images)} accumulated since the last call."""
+        with self._stage_lock:
+            timings = {name: (self.stage_times[name], self.stage_counts[name]) for name in self.stage_times}
+            self.stage_times.clear()
+            self.stage_counts.clear()
+        return timings
+
+    @staticmethod
+    def decode(data):
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        if buffer.size == 0:
+            return None
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    @staticmethod
+    def encode(meme_img, format="JPEG", quality=90):
+        buffer = BytesIO()
+        meme_img.convert("RGB").save(buffer, format=format, quality=quality)
+        return buffer.getvalue()
+
+    def _read(self, image):
+        if isinstance(image, (bytes, bytearray)):
+            image = self.decode(image)
+            image_path = None
+        elif isinstance(image, str):
+            image_path = image
+            image = cv2.imread(image_path)
+            print("image read...")
+        else:
+            image_path = None
+
+        if image is None:
+            raise ValueError("failed to read image")
+
+        return FrameContext.of(image), image_path
+
+    def _no_face_result(self, frame):
+        print("no human face detected...")
+        return {
+            "meme": self.meme_generator.create_error_meme(frame, "no human faces"),
+            "output_path": None,
+            "emotions": [],
+            "percentages": [],
+            "text": None,
+            "partial": False,
+            "missing": [],
+        }
+
+    def _caption(self, emotion_result):
+        emotion, percentage = emotion_result
+        if self.caption_pool is not None:
+            text = self.caption_pool.get_caption(emotion, percentage)
+        else:
+            text = self.text_generator.generate_caption(emotion, percentage)
+
+        if not text:
+            text = get_random_text(emotion[0])
+        return text
+
+    def _stored_features(self, image_path):
+        if self.feature_store is None or image_path is None:
+            return None
+        features = self.feature_store.load(image_path)
+        if features is not None:
+            print("using stored features...")
+        return features
+
+    def _finish(self, frame, image_path, face, landmarks, emotion_result, output_path, text_regions=None):
+        emotion, percentage = emotion_result
+        with self.stage("caption"):
+            text = self._caption(emotion_result)
+
+        text_region = (text_regions or {}).get(self.meme_generator.uses_corner(text))
+        with self.stage("render"):
+            meme_img = self.meme_generator.create_meme(
+                frame, face, landmarks, text, text_region
+            )
+
+        if output_path is None and image_path is not None:
+            os.makedirs("output", exist_ok=True)
+            output_path = os.path.join("output", f"meme_{os.path.basename(image_path)}")
+
+        if output_path is not None:
+            with self.stage("save"):
+                meme_img.save(output_path)
+            print(f"meme saved to: {output_path}...")
+
+        return {
+            "meme": meme_img,
+            "output_path": output_path,
+            "emotions": emotion,
+            "percentages": percentage,
+            "text": text,
+            "partial": emotion_result.partial,
+            "missing": emotion_result.missing,
+        }
+
+    def run(self, image, output_path=None):
+        frame, image_path = self._read(image)
+
+        stored = self._stored_features(image_path)
+        if stored is not None:
+            if not stored["faces"]:
+                return self._no_face_result(frame)
+            first = stored["faces"][0]
+            return self._finish(frame, image_path, first["face"], first["landmarks"], first["emotion"],
+                                output_path, first["text_regions"])
+
+        faces = self.face_utils.detect_faces(frame)
+        print("faces detected...")
+
+        if not faces:
+            return self._no_face_result(frame)
+
+        face = faces[0]
+        landmarks = self.face_utils.get_landmarks(frame, face)
+        emotion_result = self.emotion_detector.detect_emotion(frame, face)
+
+        return self._finish(frame, image_path, face, landmarks, emotion_result, output_path)
+
+    def analyze_emotions(self, image):
+        """EmotionResult for the first face in image, or None without a face."""
+        frame, image_path = self._read(image)
+
+        stored = self._stored_features(image_path)
+        if stored is not None:
+            return stored["faces"][0]["emotion"] if stored["faces"] else None
+
+        faces = self.face_utils.detect_faces(frame)
+        if not faces:
+            return None
+        return self.emotion_detector.detect_emotion(frame, faces[0])
+
+    def run_multi(self, image, composite=False, output_dir=None):
+        frame, image_path = self._read(image)
+
+        stored = self._stored_features(image_path)
+        if stored is not None:
+            faces = [f["face"] for f in stored["faces"]]
+        else:
+            faces = self.face_utils.detect_faces(frame)
+        print(f"{len(faces)} faces detected...")
+
+        if not faces:
+            result = self._no_face_result(frame)
+            return {"memes": [result["meme"]], "output_paths": [None], "faces": [], "composite": composite}
+
+        if stored is not None:
+            landmarks_list = [f["landmarks"] for f in stored["faces"]]
+            emotion_results = [f["emotion"] for f in stored["faces"]]
+        else:
+            landmarks_list = [self.face_utils.get_landmarks(frame, face) for face in faces]
+            face_crops = [self.face_utils.crop_face(frame, face) for face in faces]
+            emotion_results = self.emotion_detector.detect_emotion_batch(face_crops)
+        texts = [self._caption(emotion_result) for emotion_result in emotion_results]
+
+        text_regions = [None] * len(faces)
+        if stored is not None:
+            text_regions = [f["text_regions"].get(self.meme_generator.uses_corner(text))
+                            for f, text in zip(stored["faces"], texts)]
+
+        if composite:
+            memes = [self.meme_generator.create_composite_meme(frame, faces, landmarks_list, texts, text_regions)]
+        else:
+            memes = [self.meme_generator.create_meme(frame, face, landmarks, text, text_region)
+                     for face, landmarks, text, text_region in zip(faces, landmarks_list, texts, text_regions)]
+
+        output_paths = [None] * len(memes)
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            base = os.path.splitext(os.path.basename(image_path))[0] if image_path else "image"
+            for i, meme_img in enumerate(memes):
+                suffix = "all" if composite else f"face{i + 1}"
+                output_paths[i] = os.path.join(output_dir, f"meme_{base}_{suffix}.jpg")
+                meme_img.convert("RGB").save(output_paths[i])
+                print(f"meme saved to: {output_paths[i]}...")
+
+        return {
+            "memes": memes,
+            "output_paths": output_paths,
+            "faces": [
+                {
+                    "box": FrameContext.face_key(face),
+                    "emotions": emotion_result.emotions,
+                    "percentages": emotion_result.percentages,
+                    "text": text,
+                    "partial": emotion_result.partial,
+                }
+                for face, emotion_result, text in zip(faces, emotion_results, texts)
+            ],
+            "composite": composite,
+        }
+
+    @staticmethod
+    def batch_output_paths(images, output_dir=None, start_index=0):
+        """One output path per image of a batch. Dataset filenames repeat across
+        set folders, so image paths are named after their path relative to the
+        folder all of them share; decoded images are numbered by index and
+        only saved when output_dir is given."""
+        paths = [os.path.abspath(image) for image in images if isinstance(image, str)]
+        root = os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else None
+
+        output_paths = []
+        for index, image in enumerate(images):
+            if isinstance(image, str):
+                name = os.path.relpath(os.path.abspath(image), root).replace(os.sep, "_")
+                output_paths.append(os.path.join(output_dir or "output", f"meme_{name}"))
+            elif output_dir is not None:
+                output_paths.append(os.path.join(output_dir, f"meme_{start_index + index:04d}.jpg"))
+            else:
+                output_paths.append(None)
+        return output_paths
+
+    def run_batch(self, images, output_dir=None, start_index=0, output_paths=None):
+        print(f"start creating {len(images)} memes...")
+        if output_paths is None:
+            output_paths = self.batch_output_paths(images, output_dir, start_index)
+
+        with self.stage("read", len(images)):
+            frames = [self._read(image) for image in images]
+        with self.stage("features", len(images)):
+            stored = [self._stored_features(image_path) for _, image_path in frames]
+
+        # only images without current stored features go through detection
+        pending = [i for i, features in enumerate(stored) if features is None]
+        all_faces = [[f["face"] for f in features["faces"]] if features is not None else None
+                     for features in stored]
+        with self.stage("detect", len(pending)):
+            for i, faces in zip(pending, self.face_utils.detect_faces_batch([frames[i][0] for i in pending])):
+                all_faces[i] = faces
+        print("faces detected...")
+
+        face_crops = []
+        for i in pending:
+            if all_faces[i]:
+                face_crops.append(self.face_utils.crop_face(frames[i][0], all_faces[i][0]))
+
+        with self.stage("emotion", len(face_crops)):
+            emotion_results = iter(self.emotion_detector.detect_emotion_batch(face_crops))
+        print("emotions detected...")
+
+        results = []
+        for index, ((frame, image_path), faces) in enumerate(zip(frames, all_faces)):
+            if not faces:
+                results.append(self._no_face_result(frame))
+                continue
+
+            output_path = output_paths[index]
+            if output_path is not None:
+                os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+            if stored[index] is not None:
+                first = stored[index]["faces"][0]
+                results.append(self._finish(frame, image_path, first["face"], first["landmarks"],
+                                            first["emotion"], output_path, first["text_regions"]))
+                continue
+
+            face = faces[0]
+            with self.stage("landmarks"):
+                landmarks = self.face_utils.get_landmarks(frame, face)
+            results.append(self._finish(frame, image_path, face, landmarks, next(emotion_results), output_path))
+
+        return results
+
+    def generate(self, image_path, output_path=None):
+        print(f"start creating meme: {image_path}...")
+        result = self.run(image_path, output_path)
+        return result["meme"], result["output_path"]
@@ -1,13 +1,11 @@
-from openai import OpenAI
-import requests
-
-
 class EmotionFusionGenerator:
     def __init__(self, llm_model="deepseek-chat"):
         self.api_key = 'sk-62167b879ab04cac9b75e04401351095'
         self.llm_model = llm_model
         self.emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
 
+        from openai import OpenAI
+
         self.client = OpenAI(
             api_key=self.api_key,
             base_url="https://api.deepseek.com/v1"
@@ -15,6 +13,8 @@ class EmotionFusionGenerator:
 
     @staticmethod
     def check_api_key(api_key):
+        import requests
+
         url = "https://api.deepseek.com/v1/models"
         headers = {"Authorization": f"Bearer {api_key}"}
         try: